@@ -1,15 +1,26 @@
 import os
-from datetime import datetime
-import concurrent.futures, uuid, time
+import json
+import queue
+from datetime import datetime, timedelta
+import concurrent.futures, uuid, time, socket, threading
+from functools import lru_cache
 
+import click
 from flask import (
     Flask, render_template, request,
-    redirect, url_for, flash, jsonify
+    redirect, url_for, flash, jsonify, abort,
+    Response, stream_with_context
 )
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.mysql import LONGBLOB
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
-from graph import start_agentic_flow
+from graph import start_agentic_flow, warm_up as warm_up_graph
+from spec import SpecDocumentError, SpecError, load_spec
+from replay import replay
+from specdiff import api_key
+import bodystore
+import events
 
 # ──────────────────────────────────────────────────────────────────────────────
 #  Configurazione
@@ -17,7 +28,16 @@ from graph import start_agentic_flow
 
 load_dotenv()
 
-executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+# Numero massimo di job (upload di spec) eseguiti in parallelo e tipo di pool:
+# "thread" (default) oppure "process" per isolare ogni run in un processo.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_EXECUTOR = os.getenv("JOB_EXECUTOR", "thread")
+# Ogni processo aggiorna heartbeat_at dei propri job ogni JOB_HEARTBEAT secondi;
+# un job queued/running senza heartbeat da JOB_STALE_AFTER secondi è orfano.
+JOB_HEARTBEAT = float(os.getenv("JOB_HEARTBEAT", "30"))
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", "120"))
+# Secondi tra due keepalive dello stream SSE di un run.
+SSE_KEEPALIVE = float(os.getenv("SSE_KEEPALIVE", "15"))
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "replace‑me")
@@ -35,41 +55,290 @@ db = SQLAlchemy(app)
 class RunSequence(db.Model):
     __tablename__ = "run_sequence"
     id = db.Column(db.String(256), primary_key=True)
-    date = db.Column(db.DateTime, nullable=False)
+    date = db.Column(db.DateTime, nullable=False, index=True)
 
     requests = db.relationship("Request", back_populates="run_seq",
                                cascade="all, delete-orphan")
+    summary = db.relationship("RunSummary", uselist=False,
+                              cascade="all, delete-orphan")
+    operations = db.relationship("OperationSummary",
+                                 cascade="all, delete-orphan")
 
 
 class Request(db.Model):
     __tablename__ = "request"
+    __table_args__ = (db.Index("ix_request_api_method", "api", "method"),
+                      # Join del confronto tra due run (compare_runs).
+                      db.Index("ix_request_run_operation", "run_sequence", "api", "method", "variant"))
     id = db.Column(db.String(256), primary_key=True)
     date = db.Column(db.DateTime)
     api = db.Column(db.String(256), nullable=False)
     api_path = db.Column(db.String(512), nullable=False)
     method = db.Column(db.String(10), nullable=False)
+    # Caso di test tra le chiamate della stessa api/method (runner.py).
+    variant = db.Column(db.String(128))
     http_code = db.Column(db.Integer, nullable=False)
-    outcome = db.Column(db.String(10), nullable=False)
+    outcome = db.Column(db.String(10), nullable=False, index=True)
     request_json = db.Column("request", db.JSON)
     response_json = db.Column("response", db.JSON)
+    # Body grandi: il JSON resta null e la colonna *_ref punta a request_body.
+    request_ref = db.Column(db.String(64), index=True)
+    response_ref = db.Column(db.String(64), index=True)
+    # Come rieseguire la chiamata: body, header, http code attesi, dipendenze (replay.py).
+    replay = db.Column(db.JSON)
+    # Violazioni della response rispetto alla spec (validator.py), null se non validata.
+    violations = db.Column(db.JSON)
+    # Tempi in millisecondi, dimensioni dei body in byte e retry (runner.py).
+    latency_ms = db.Column(db.Float)
+    ttfb_ms = db.Column(db.Float)
+    request_bytes = db.Column(db.Integer)
+    response_bytes = db.Column(db.Integer)
+    retries = db.Column(db.Integer)
     run_sequence = db.Column(db.String(256),
                              db.ForeignKey("run_sequence.id"),
-                             nullable=False)
+                             nullable=False, index=True)
 
     run_seq = db.relationship("RunSequence", back_populates="requests")
 
+
+class RunSummary(db.Model):
+    """Riepilogo di un run archiviato: le sue request sono state rimosse dalla retention."""
+    __tablename__ = "run_summary"
+    run_sequence = db.Column(db.String(256), db.ForeignKey("run_sequence.id"), primary_key=True)
+    total = db.Column(db.Integer, nullable=False)
+    ok = db.Column(db.Integer, nullable=False)
+    failed = db.Column(db.Integer, nullable=False)
+    p50_ms = db.Column(db.Float)
+    p95_ms = db.Column(db.Float)
+    rolled_up_at = db.Column(db.DateTime, nullable=False)
+
+
+class OperationSummary(db.Model):
+    """Riepilogo per api/method di un run archiviato."""
+    __tablename__ = "operation_summary"
+    run_sequence = db.Column(db.String(256), db.ForeignKey("run_sequence.id"), primary_key=True)
+    api = db.Column(db.String(256), primary_key=True)
+    method = db.Column(db.String(10), primary_key=True)
+    total = db.Column(db.Integer, nullable=False)
+    failed = db.Column(db.Integer, nullable=False)
+    avg_ms = db.Column(db.Float)
+    p50_ms = db.Column(db.Float)
+    p95_ms = db.Column(db.Float)
+    max_ms = db.Column(db.Float)
+
+
+class RequestBody(db.Model):
+    """Body compresso fuori riga (bodystore.py), uno per contenuto distinto."""
+    __tablename__ = "request_body"
+    hash = db.Column(db.String(64), primary_key=True)
+    codec = db.Column(db.String(8), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    data = db.Column(db.LargeBinary().with_variant(LONGBLOB, "mysql"), nullable=False)
+    # Ultima scrittura che lo ha referenziato: la retention non tocca i body recenti.
+    last_seen = db.Column(db.DateTime, index=True)
+
+
+class Job(db.Model):
+    """Esecuzione asincrona di uno spec caricato da /start_test o del replay di un run."""
+    __tablename__ = "job"
+    id = db.Column(db.String(36), primary_key=True)
+    status = db.Column(db.String(10), nullable=False, default="queued")
+    spec_file = db.Column(db.String(512), nullable=False)
+    run_sequence = db.Column(db.String(256), index=True)
+    # Replay: run di origine e base URL alternativo (null = quello registrato).
+    replay_of = db.Column(db.String(256))
+    base_url = db.Column(db.String(512))
+    error = db.Column(db.Text)
+    # Processo (host:pid) che esegue il job e ultimo segno di vita.
+    owner = db.Column(db.String(128))
+    heartbeat_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "run_sequence": self.run_sequence,
+            "replay_of": self.replay_of,
+            "error": self.error,
+            "created_at": strftime_or_empty(self.created_at),
+            "started_at": strftime_or_empty(self.started_at),
+            "finished_at": strftime_or_empty(self.finished_at),
+        }
+
 # ──────────────────────────────────────────────────────────────────────────────
 #  Utils
 # ──────────────────────────────────────────────────────────────────────────────
 def strftime_or_empty(dt: datetime | None) -> str:
     return dt.strftime("%Y-%m-%d %H:%M:%S") if dt else ""
 
+# ──────────────────────────────────────────────────────────────────────────────
+#  Job asincroni
+# ──────────────────────────────────────────────────────────────────────────────
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+def _init_worker_process():
+    # Le connessioni ereditate dal processo padre non vanno riusate dopo il fork.
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def _make_executor() -> concurrent.futures.Executor:
+    if JOB_EXECUTOR == "process":
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=JOB_WORKERS, initializer=_init_worker_process)
+    return concurrent.futures.ThreadPoolExecutor(max_workers=JOB_WORKERS,
+                                                 thread_name_prefix="job")
+
+
+def _init_db():
+    """Crea le tabelle, le colonne e gli indici mancanti all'avvio.
+
+    Le tabelle request/run_sequence possono essere state create dal codice
+    generato o da una versione precedente: create_all non aggiunge colonne
+    né indici a tabelle esistenti.
+    """
+    with app.app_context():
+        db.create_all()
+        inspector = db.inspect(db.engine)
+        for table in (RunSequence.__table__, Request.__table__, RequestBody.__table__, Job.__table__):
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = column.type.compile(dialect=db.engine.dialect)
+                    with db.engine.begin() as conn:
+                        conn.execute(db.text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {ddl}"))
+            for index in table.indexes:
+                index.create(bind=db.engine, checkfirst=True)
+
+
+def job_owner() -> str:
+    """Identità del processo che accoda ed esegue i job."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _fail_stale_jobs():
+    """Segna come falliti i job queued/running il cui processo non dà più segni di vita.
+
+    Con più worker (gunicorn) o dopo un riavvio i job di altri processi vivi
+    hanno un heartbeat recente e non vengono toccati.
+    """
+    cutoff = datetime.now() - timedelta(seconds=JOB_STALE_AFTER)
+    (Job.query.filter(Job.status.in_((JOB_QUEUED, JOB_RUNNING)),
+                      db.or_(Job.owner.is_(None), Job.owner != job_owner()),
+                      db.func.coalesce(Job.heartbeat_at, Job.created_at) < cutoff)
+     .update({Job.status: JOB_FAILED,
+              Job.error: "Interrotto: il processo che lo eseguiva non risponde",
+              Job.finished_at: datetime.now()},
+             synchronize_session=False))
+
+
+def _heartbeat():
+    """Rinnova l'heartbeat dei job di questo processo e recupera quelli orfani."""
+    with app.app_context():
+        (Job.query.filter(Job.owner == job_owner(), Job.status.in_((JOB_QUEUED, JOB_RUNNING)))
+         .update({Job.heartbeat_at: datetime.now()}, synchronize_session=False))
+        _fail_stale_jobs()
+        db.session.commit()
+        db.session.remove()
+
+
+def _heartbeat_loop():
+    while True:
+        time.sleep(JOB_HEARTBEAT)
+        try:
+            _heartbeat()
+        except Exception as e:
+            print(f"Job heartbeat failed: {type(e).__name__}: {e}")
+
+
+_init_db()
+_heartbeat()
+threading.Thread(target=_heartbeat_loop, name="job-heartbeat", daemon=True).start()
+executor = _make_executor()
+# Il grafo LangGraph viene compilato una sola volta, prima della prima richiesta;
+# con EXECUTION_BACKEND=pool partono anche gli interpreti pre-riscaldati.
+warm_up_graph()
+
 # ──────────────────────────────────────────────────────────────────────────────
 #  Rotte
 # ──────────────────────────────────────────────────────────────────────────────
+HOME_PAGE_SIZE = int(os.getenv("HOME_PAGE_SIZE", "25"))
+
+
+def parse_cursor(value: str | None) -> tuple[datetime, str] | None:
+    """Cursore di paginazione "<data iso>|<id>" della riga di confine."""
+    if not value or "|" not in value:
+        return None
+    date_part, run_id = value.split("|", 1)
+    try:
+        return datetime.fromisoformat(date_part), run_id
+    except ValueError:
+        return None
+
+
+def make_cursor(seq: "RunSequence") -> str:
+    return f"{seq.date.isoformat()}|{seq.id}"
+
+
+def run_stats(run_ids: list[str]) -> dict[str, dict]:
+    """Totale richieste e conteggi OK/FAILED per run, con una sola query raggruppata.
+
+    I run archiviati dalla retention leggono il loro run_summary.
+    """
+    if not run_ids:
+        return {}
+    archived = {s.run_sequence: {"total": s.total, "ok": s.ok, "failed": s.failed,
+                                 "p50": s.p50_ms, "p95": s.p95_ms}
+                for s in RunSummary.query.filter(RunSummary.run_sequence.in_(run_ids))}
+    run_ids = [run_id for run_id in run_ids if run_id not in archived]
+    if not run_ids:
+        return archived
+    rows = (db.session.query(
+                Request.run_sequence,
+                db.func.count(Request.id),
+                db.func.sum(db.case((Request.outcome == "OK", 1), else_=0)),
+                db.func.sum(db.case((Request.outcome == "FAILED", 1), else_=0)))
+            .filter(Request.run_sequence.in_(run_ids))
+            .group_by(Request.run_sequence)
+            .all())
+    stats = {run_id: {"total": total, "ok": int(ok or 0), "failed": int(failed or 0)}
+             for run_id, total, ok, failed in rows}
+    for run_id, p50, p95 in latency_percentiles([Request.run_sequence],
+                                                Request.run_sequence.in_(run_ids)):
+        stats.setdefault(run_id, {}).update(p50=p50, p95=p95)
+    return {**stats, **archived}
+
+
+def latency_percentiles(group_by: list, *filters) -> list[tuple]:
+    """p50 e p95 della latenza per gruppo: (chiavi..., p50, p95).
+
+    Una sola query: CUME_DIST() sulla latenza di ogni gruppo, poi la minima
+    latenza con distribuzione cumulata >= 0.5 / 0.95 (MySQL 8+, SQLite 3.25+).
+    """
+    cume = db.func.cume_dist().over(partition_by=group_by,
+                                    order_by=Request.latency_ms).label("cume")
+    ranked = (db.session.query(*group_by, Request.latency_ms.label("latency"), cume)
+              .filter(Request.latency_ms.isnot(None), *filters)
+              .subquery())
+    keys = [ranked.c[c.key] for c in group_by]
+    return (db.session.query(
+                *keys,
+                db.func.min(db.case((ranked.c.cume >= 0.5, ranked.c.latency))),
+                db.func.min(db.case((ranked.c.cume >= 0.95, ranked.c.latency))))
+            .group_by(*keys)
+            .all())
+
+
 @app.route("/")
 def home():
-    """Pagina 1 – elenco run_sequence con filtri data."""
+    """Pagina 1 – elenco run_sequence con filtri data, paginato per data (keyset)."""
     q = RunSequence.query
 
     date_from = request.args.get("date_from")
@@ -80,29 +349,277 @@ def home():
     if date_to:
         q = q.filter(RunSequence.date <= date_to)
 
-    sequences = q.order_by(RunSequence.date.desc()).all()
+    # "after": pagina successiva (run più vecchie), "before": pagina precedente.
+    after = parse_cursor(request.args.get("after"))
+    before = parse_cursor(request.args.get("before"))
+    if before:
+        d, run_id = before
+        q = (q.filter(db.or_(RunSequence.date > d,
+                             db.and_(RunSequence.date == d, RunSequence.id > run_id)))
+              .order_by(RunSequence.date.asc(), RunSequence.id.asc()))
+    else:
+        if after:
+            d, run_id = after
+            q = q.filter(db.or_(RunSequence.date < d,
+                                db.and_(RunSequence.date == d, RunSequence.id < run_id)))
+        q = q.order_by(RunSequence.date.desc(), RunSequence.id.desc())
+
+    sequences = q.limit(HOME_PAGE_SIZE + 1).all()
+    has_more = len(sequences) > HOME_PAGE_SIZE
+    sequences = sequences[:HOME_PAGE_SIZE]
+    if before:
+        sequences.reverse()
+
+    has_newer = bool(after) or (bool(before) and has_more)
+    has_older = (not before and has_more) or bool(before)
+    newer_cursor = make_cursor(sequences[0]) if sequences and has_newer else None
+    older_cursor = make_cursor(sequences[-1]) if sequences and has_older else None
+
     return render_template("home.html",
                            sequences=sequences,
+                           stats=run_stats([s.id for s in sequences]),
+                           newer_cursor=newer_cursor,
+                           older_cursor=older_cursor,
                            date_from=date_from or "",
                            date_to=date_to or "")
 
 
 @app.route("/run/<run_id>")
 def run_details(run_id: str):
-    """Pagina 2 – richieste di un run_sequence."""
-    seq = RunSequence.query.get_or_404(run_id)
+    """Pagina 2 – richieste di un run_sequence (righe caricate da run_requests)."""
+    seq = db.session.get(RunSequence, run_id)
+    # Un run appena accodato non ha ancora la sua run_sequence: la pagina
+    # mostra l'avanzamento via SSE finché il job non termina.
+    job = Job.query.filter_by(run_sequence=run_id).first()
+    if seq is None and job is None:
+        abort(404)
+    live = job is not None and job.status in (JOB_QUEUED, JOB_RUNNING)
+    # Run base proposto per il confronto: quello replicato oppure il
+    # precedente della stessa API (stesso api_key della specifica).
+    previous = None
+    if job is not None and job.replay_of:
+        previous = db.session.get(RunSequence, job.replay_of)
+    if previous is None and seq is not None and job is not None:
+        previous = _previous_run(seq, job)
+    return render_template("requests.html", run_id=run_id, seq=seq, live=live,
+                           previous=previous)
+
+
+@lru_cache(maxsize=256)
+def _spec_key(spec_file: str) -> str | None:
+    """api_key della specifica caricata; None se il file manca o non è valido.
+
+    I file caricati non cambiano (il nome contiene l'id del job): la cache è sicura.
+    """
+    try:
+        return api_key(load_spec(spec_file))
+    except (OSError, ValueError):
+        return None
+
+
+def _previous_run(seq: RunSequence, job: Job, limit: int = 50) -> RunSequence | None:
+    """Ultimo run precedente a ``seq`` eseguito sulla stessa API di ``job``."""
+    key = _spec_key(job.spec_file) if job.spec_file else None
+    if key is None:
+        return None
+    candidates = (db.session.query(RunSequence, Job.spec_file)
+                  .join(Job, Job.run_sequence == RunSequence.id)
+                  .filter(RunSequence.date < seq.date, Job.spec_file != "")
+                  .order_by(RunSequence.date.desc()).limit(limit))
+    for run, spec_file in candidates:
+        if spec_file == job.spec_file or _spec_key(spec_file) == key:
+            return run
+    return None
+
+
+# Colonne restituite alla tabella: i JSON request/response restano fuori e
+# vengono caricati solo su richiesta da /request/<req_id>/json/<kind>.
+REQUEST_SUMMARY_COLUMNS = ("date", "id", "api", "api_path", "method",
+                           "http_code", "outcome", "latency_ms", "retries")
+REQUEST_ORDERABLE_COLUMNS = {"date", "api", "api_path", "method",
+                             "http_code", "outcome", "latency_ms", "retries"}
+
+
+@app.get("/run/<run_id>/requests")
+def run_requests(run_id: str):
+    """Richieste di un run_sequence secondo il protocollo server-side di DataTables."""
+    args = request.args
+    draw = args.get("draw", type=int, default=0)
+    start = max(args.get("start", type=int, default=0), 0)
+    length = args.get("length", type=int, default=50)
+    search = (args.get("search[value]") or "").strip()
+
+    base = Request.query.filter(Request.run_sequence == run_id)
+    total = base.order_by(None).count()
+
+    q = base
+    if search:
+        like = f"%{search}%"
+        q = q.filter(db.or_(Request.api.ilike(like),
+                            Request.method.ilike(like),
+                            Request.outcome.ilike(like),
+                            db.cast(Request.http_code, db.String).like(like)))
+    filtered = q.order_by(None).count() if search else total
+
+    col_idx = args.get("order[0][column]", type=int)
+    col_name = args.get(f"columns[{col_idx}][data]") if col_idx is not None else None
+    if col_name not in REQUEST_ORDERABLE_COLUMNS:
+        col_name = "date"
+    column = getattr(Request, col_name)
+    direction = args.get("order[0][dir]", "desc")
+    q = q.order_by(column.asc() if direction == "asc" else column.desc(), Request.id)
+
+    rows = q.options(db.load_only(*(getattr(Request, c) for c in REQUEST_SUMMARY_COLUMNS)))
+    if length > 0:
+        rows = rows.offset(start).limit(length)
+
+    data = [{
+        "date": strftime_or_empty(r.date),
+        "id": r.id,
+        "api": r.api,
+        "api_path": r.api_path,
+        "method": r.method,
+        "http_code": r.http_code,
+        "outcome": r.outcome,
+        "latency_ms": r.latency_ms,
+        "retries": r.retries,
+    } for r in rows]
+
+    return jsonify({"draw": draw,
+                    "recordsTotal": total,
+                    "recordsFiltered": filtered,
+                    "data": data})
 
-    # DataTables può fare l’ordinamento lato client;
-    # se preferisci lato server, usa request.args.get("order") ecc.
-    requests_rows = Request.query.filter_by(run_sequence=run_id).all()
-    return render_template("requests.html",
-                           seq=seq,
-                           requests_rows=requests_rows)
+
+@app.get("/stats/apis")
+def api_stats():
+    """Pagina 3 – latenza, dimensioni e retry aggregati per api/method su tutte le run."""
+    date_from = request.args.get("date_from")
+    date_to = request.args.get("date_to")
+    filters = []
+    if date_from:
+        filters.append(Request.date >= date_from)
+    if date_to:
+        filters.append(Request.date <= date_to)
+
+    rows = (db.session.query(
+                Request.api,
+                Request.method,
+                db.func.count(Request.id),
+                db.func.count(db.distinct(Request.run_sequence)),
+                db.func.sum(db.case((Request.outcome == "FAILED", 1), else_=0)),
+                db.func.avg(Request.latency_ms),
+                db.func.max(Request.latency_ms),
+                db.func.avg(Request.ttfb_ms),
+                db.func.avg(Request.request_bytes),
+                db.func.avg(Request.response_bytes),
+                db.func.sum(Request.retries))
+            .filter(*filters)
+            .group_by(Request.api, Request.method)
+            .order_by(Request.api, Request.method)
+            .all())
+    percentiles = {(api, method): (p50, p95) for api, method, p50, p95
+                   in latency_percentiles([Request.api, Request.method], *filters)}
+
+    apis = [{
+        "api": api,
+        "method": method,
+        "requests": count,
+        "runs": runs,
+        "failed": int(failed or 0),
+        "avg_ms": avg_ms,
+        "p50_ms": percentiles.get((api, method), (None, None))[0],
+        "p95_ms": percentiles.get((api, method), (None, None))[1],
+        "max_ms": max_ms,
+        "ttfb_ms": ttfb_ms,
+        "request_bytes": request_bytes,
+        "response_bytes": response_bytes,
+        "retries": int(retries or 0),
+    } for api, method, count, runs, failed, avg_ms, max_ms, ttfb_ms,
+          request_bytes, response_bytes, retries in rows]
+
+    return render_template("api_stats.html",
+                           apis=apis,
+                           date_from=date_from or "",
+                           date_to=date_to or "")
+
+
+# Una chiamata è "più lenta" se supera di questo fattore e di almeno questi ms il run base.
+COMPARE_SLOWER_RATIO = float(os.getenv("COMPARE_SLOWER_RATIO", "1.5"))
+COMPARE_SLOWER_MIN_MS = float(os.getenv("COMPARE_SLOWER_MIN_MS", "50"))
+# Ordine di visualizzazione: prima le regressioni.
+COMPARE_CHANGES = ("regressed", "removed", "status_changed", "slower", "fixed", "added", "unchanged")
+
+
+def compare_runs(base_id: str, head_id: str) -> list[dict]:
+    """Richieste di due run accoppiate per (api, method, variant).
+
+    Una sola query: LEFT JOIN base -> head sull'indice ix_request_run_operation,
+    in UNION ALL con le richieste presenti solo in head.
+    """
+    base, head = db.aliased(Request), db.aliased(Request)
+
+    def matching(x, y, run_id):
+        return db.and_(y.run_sequence == run_id, y.api == x.api,
+                       y.method == x.method, y.variant == x.variant)
+
+    pairs = (db.session.query(base.api, base.method, base.variant,
+                              base.id, base.http_code, base.outcome, base.latency_ms,
+                              head.id, head.http_code, head.outcome, head.latency_ms)
+             .outerjoin(head, matching(base, head, head_id))
+             .filter(base.run_sequence == base_id))
+    added = (db.session.query(head.api, head.method, head.variant,
+                              db.null(), db.null(), db.null(), db.null(),
+                              head.id, head.http_code, head.outcome, head.latency_ms)
+             .outerjoin(base, matching(head, base, base_id))
+             .filter(head.run_sequence == head_id, base.id.is_(None)))
+
+    rows = []
+    for (api, method, variant, base_req, base_code, base_outcome, base_ms,
+         head_req, head_code, head_outcome, head_ms) in pairs.union_all(added).all():
+        delta = head_ms - base_ms if base_ms is not None and head_ms is not None else None
+        if base_req is None:
+            change = "added"
+        elif head_req is None:
+            change = "removed"
+        elif base_outcome == "OK" and head_outcome != "OK":
+            change = "regressed"
+        elif base_outcome != "OK" and head_outcome == "OK":
+            change = "fixed"
+        elif base_code != head_code:
+            change = "status_changed"
+        elif (delta is not None and delta >= COMPARE_SLOWER_MIN_MS
+              and head_ms >= base_ms * COMPARE_SLOWER_RATIO):
+            change = "slower"
+        else:
+            change = "unchanged"
+        rows.append({"api": api, "method": method, "variant": variant, "change": change,
+                     "base_id": base_req, "base_code": base_code,
+                     "base_outcome": base_outcome, "base_ms": base_ms,
+                     "head_id": head_req, "head_code": head_code,
+                     "head_outcome": head_outcome, "head_ms": head_ms,
+                     "delta_ms": delta})
+    rows.sort(key=lambda r: (COMPARE_CHANGES.index(r["change"]), r["api"], r["method"], r["variant"] or ""))
+    return rows
+
+
+@app.get("/compare/<base_id>/<head_id>")
+def compare(base_id: str, head_id: str):
+    """Pagina 4 – confronto tra due run: esiti invertiti, http code cambiati, delta di latenza."""
+    base = db.get_or_404(RunSequence, base_id)
+    head = db.get_or_404(RunSequence, head_id)
+    rows = compare_runs(base_id, head_id)
+    summary = {change: 0 for change in COMPARE_CHANGES}
+    for row in rows:
+        summary[row["change"]] += 1
+    if request.args.get("format") == "json":
+        return jsonify({"base": base_id, "head": head_id, "summary": summary, "rows": rows})
+    return render_template("compare.html", base=base, head=head, rows=rows, summary=summary)
 
 
 @app.route("/start_test", methods=["POST"])
 def start_test():
-    """Upload di file .json/.yaml; al momento li salviamo e basta."""
+    """Upload di file .json/.yaml; il test viene accodato come job asincrono."""
     f = request.files.get("spec_file")
     if not f:
         flash("Nessun file selezionato", "danger")
@@ -114,33 +631,314 @@ def start_test():
         flash("Formato non consentito", "danger")
         return redirect(url_for("home"))
 
-    filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
+    job_id = str(uuid.uuid4())
+    # Prefisso con l'id del job: upload concorrenti con lo stesso nome
+    # non devono sovrascriversi a vicenda.
+    filepath = os.path.join(app.config["UPLOAD_FOLDER"], f"{job_id}_{filename}")
     f.save(filepath)
+
+    # File che non sono documenti YAML/JSON vengono scartati subito, senza
+    # occupare un worker. Gli spec che il parser non gestisce (Swagger 2.0,
+    # $ref esterni) passano all'agent, che lavora sul testo.
+    try:
+        load_spec(filepath)
+    except UnicodeDecodeError:
+        os.remove(filepath)
+        return {"ok": False, "err": "Il file non è in UTF-8"}
+    except SpecDocumentError as e:
+        os.remove(filepath)
+        return {"ok": False, "err": str(e)}
+    except ValueError as e:
+        print(f"Spec {filename}: {e}; il codice viene generato dall'agent")
+
+    # Letto dopo il submit, job.run_sequence potrebbe già essere stato
+    # azzerato da un job fallito subito: l'id resta in una variabile.
+    run_id = str(uuid.uuid4())
+    try:
+        job = Job(id=job_id,
+                  status=JOB_QUEUED,
+                  spec_file=filepath,
+                  run_sequence=run_id,
+                  created_at=datetime.now(),
+                  owner=job_owner(),
+                  heartbeat_at=datetime.now())
+        db.session.add(job)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        os.remove(filepath)
+        raise
+
+    # "force": ignora il codice e le risposte LLM in cache e rigenera con l'LLM.
+    force = request.form.get("force") in ("1", "true", "on")
+    executor.submit(run_spec_tests, job_id, force)
     flash("Spec caricato correttamente!", "success")
-    # Qui potresti lanciare la tua logica di import/test.
-    
-    #executor.submit(run_spec_tests, filepath)
-    start_agentic_flow(filepath)
-    return {"ok": True}
-    #return redirect(url_for("home"))
-
-def run_spec_tests(spec_path: str):
+    return {"ok": True,
+            "job_id": job_id,
+            "status_url": url_for("job_status", job_id=job_id),
+            "run_url": url_for("run_details", run_id=run_id)}
+
+
+@app.post("/run/<run_id>/replay")
+def replay_run(run_id: str):
+    """Accoda il replay di un run: stesse chiamate, eventualmente su un altro base URL."""
+    db.get_or_404(RunSequence, run_id)
+    base_url = (request.form.get("base_url") or "").strip() or None
+    if base_url and not base_url.startswith(("http://", "https://")):
+        return {"ok": False, "err": "Il base URL deve iniziare con http:// o https://"}
+
+    # Lo spec del run di origine, se noto, serve a validare le response.
+    source = Job.query.filter_by(run_sequence=run_id).first()
+    job_id, new_run_id = str(uuid.uuid4()), str(uuid.uuid4())
+    job = Job(id=job_id,
+              status=JOB_QUEUED,
+              spec_file=source.spec_file if source else "",
+              run_sequence=new_run_id,
+              replay_of=run_id,
+              base_url=base_url,
+              created_at=datetime.now(),
+              owner=job_owner(),
+              heartbeat_at=datetime.now())
+    db.session.add(job)
+    db.session.commit()
+
+    executor.submit(run_replay, job_id)
+    # Come in start_test: dopo il submit il job può già aver azzerato run_sequence.
+    return {"ok": True,
+            "job_id": job_id,
+            "status_url": url_for("job_status", job_id=job_id),
+            "run_url": url_for("run_details", run_id=new_run_id)}
+
+
+def run_spec_tests(job_id: str, force: bool = False):
+    """Esegue il flow agentico di un job nel pool di worker."""
+    _run_job(job_id, lambda job: start_agentic_flow(job.spec_file, run_id=job.run_sequence, force=force))
+
+
+def run_replay(job_id: str):
+    """Riesegue le request registrate del run di origine, senza LLM (replay.py)."""
+    _run_job(job_id, lambda job: replay(job.replay_of, job.base_url,
+                                        new_run_id=job.run_sequence,
+                                        spec_path=job.spec_file if os.path.exists(job.spec_file) else None))
+
+
+def _run_job(job_id: str, work):
     with app.app_context():
-        start_agentic_flow(spec_path)
+        job = db.session.get(Job, job_id)
+        job.status = JOB_RUNNING
+        job.started_at = job.heartbeat_at = datetime.now()
+        db.session.commit()
+        run_id = job.run_sequence
+        events.publish(run_id, "status", status=JOB_RUNNING)
+
+        try:
+            work(job)
+        except Exception as e:
+            job.status = JOB_FAILED
+            job.error = f"{type(e).__name__}: {e}"
+        else:
+            job.status = JOB_DONE
+
+        # Il codice generato (o il replay fallito) potrebbe non aver registrato la run_sequence.
+        if job.run_sequence and db.session.get(RunSequence, job.run_sequence) is None:
+            job.run_sequence = None
+        job.finished_at = datetime.now()
+        db.session.commit()
+        events.publish(run_id, "end", status=job.status, error=job.error)
+        db.session.remove()
+
+
+def _job_finished(run_id: str) -> bool:
+    job = Job.query.filter_by(run_sequence=run_id).first()
+    return job is None or job.status in (JOB_DONE, JOB_FAILED)
+
+
+@app.get("/run/<run_id>/events")
+def run_events(run_id: str):
+    """Stream SSE di un run: transizioni dei nodi del grafo e richieste registrate.
+
+    Gli eventi arrivano dal pub/sub in-process (events.bus): con
+    JOB_EXECUTOR=process il job gira in un altro processo e lo stream si
+    chiude solo quando il job risulta terminato.
+    """
+    def stream():
+        q = events.bus.subscribe(run_id)
+        try:
+            if _job_finished(run_id) and q.empty():
+                yield f"event: end\ndata: {json.dumps({'type': 'end'})}\n\n"
+                return
+            while True:
+                try:
+                    event = q.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    if _job_finished(run_id):
+                        yield f"event: end\ndata: {json.dumps({'type': 'end'})}\n\n"
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+                if event["type"] == "end":
+                    return
+        finally:
+            events.bus.unsubscribe(run_id, q)
+            db.session.remove()
+
+    return Response(stream_with_context(stream()),
+                    mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/jobs/<job_id>")
+def job_status(job_id: str):
+    """Stato di un job: queued/running/done/failed e run_sequence prodotta."""
+    job = db.get_or_404(Job, job_id)
+    return jsonify(job.to_dict())
+
 # ──────────────────────────────────────────────────────────────────────────────
 #  API Json per popup (opzionale, usata da JS per caricare JSON completo)
 # ──────────────────────────────────────────────────────────────────────────────
+def load_body(value, ref: str | None):
+    """Il body inline oppure, se spostato fuori riga, quello decompresso da request_body."""
+    if value is not None or not ref:
+        return value
+    body = db.session.get(RequestBody, ref)
+    return bodystore.load(body.codec, body.data) if body is not None else None
+
+
 @app.get("/request/<req_id>/json/<kind>")
 def request_json(req_id: str, kind: str):
-    """Restituisce request_json o response_json intero."""
+    """Restituisce request_json, response_json o le violazioni per intero."""
     row = Request.query.get_or_404(req_id)
     if kind == "request":
-        return jsonify(row.request_json)
+        return jsonify(load_body(row.request_json, row.request_ref))
     elif kind == "response":
-        return jsonify(row.response_json)
+        return jsonify(load_body(row.response_json, row.response_ref))
+    elif kind == "violations":
+        return jsonify(row.violations)
     else:
         return {}, 404
 
 
+# ──────────────────────────────────────────────────────────────────────────────
+#  Retention: roll-up dei run vecchi e purge a batch
+# ──────────────────────────────────────────────────────────────────────────────
+# Giorni di request complete da tenere; i run più vecchi restano solo come
+# run_summary/operation_summary. RETENTION_SUMMARY_DAYS (0 = mai) elimina
+# anche i riepiloghi e la run_sequence.
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "30"))
+RETENTION_SUMMARY_DAYS = int(os.getenv("RETENTION_SUMMARY_DAYS", "0"))
+# Righe cancellate per transazione e pausa tra due batch: lock brevi.
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "1000"))
+RETENTION_BATCH_PAUSE = float(os.getenv("RETENTION_BATCH_PAUSE", "0.1"))
+RETENTION_RUNS_PER_BATCH = int(os.getenv("RETENTION_RUNS_PER_BATCH", "20"))
+
+
+def roll_up(run_ids: list[str]):
+    """Scrive run_summary e operation_summary dei run indicati (una transazione)."""
+    now = datetime.now()
+    stats = run_stats(run_ids)
+    for run_id in run_ids:
+        # Anche un run senza request riceve il suo riepilogo (vuoto): è archiviato.
+        st = stats.get(run_id, {})
+        db.session.add(RunSummary(run_sequence=run_id,
+                                  total=st.get("total", 0), ok=st.get("ok", 0),
+                                  failed=st.get("failed", 0),
+                                  p50_ms=st.get("p50"), p95_ms=st.get("p95"),
+                                  rolled_up_at=now))
+
+    group_by = [Request.run_sequence, Request.api, Request.method]
+    percentiles = {tuple(keys): (p50, p95) for *keys, p50, p95
+                   in latency_percentiles(group_by, Request.run_sequence.in_(run_ids))}
+    rows = (db.session.query(
+                *group_by,
+                db.func.count(Request.id),
+                db.func.sum(db.case((Request.outcome == "FAILED", 1), else_=0)),
+                db.func.avg(Request.latency_ms),
+                db.func.max(Request.latency_ms))
+            .filter(Request.run_sequence.in_(run_ids))
+            .group_by(*group_by)
+            .all())
+    for run_id, api, method, total, failed, avg_ms, max_ms in rows:
+        p50, p95 = percentiles.get((run_id, api, method), (None, None))
+        db.session.add(OperationSummary(run_sequence=run_id, api=api, method=method,
+                                        total=total, failed=int(failed or 0),
+                                        avg_ms=avg_ms, p50_ms=p50, p95_ms=p95, max_ms=max_ms))
+    db.session.commit()
+
+
+def delete_in_batches(query, column) -> int:
+    """Cancella le righe di query a blocchi di RETENTION_BATCH_SIZE, un commit per blocco."""
+    deleted = 0
+    while True:
+        keys = [key for (key,) in query.with_entities(column).limit(RETENTION_BATCH_SIZE).all()]
+        if not keys:
+            return deleted
+        deleted += (query.filter(column.in_(keys))
+                    .delete(synchronize_session=False))
+        db.session.commit()
+        time.sleep(RETENTION_BATCH_PAUSE)
+
+
+def apply_retention(days: int = RETENTION_DAYS,
+                    summary_days: int = RETENTION_SUMMARY_DAYS) -> dict:
+    """Archivia i run più vecchi di ``days`` giorni e ne cancella request e body.
+
+    Ogni passo è idempotente: un'esecuzione interrotta riprende da dove si
+    era fermata (i run già riepilogati vengono solo ripuliti).
+    """
+    cutoff = datetime.now() - timedelta(days=days)
+    result = {"rolled_up": 0, "requests": 0, "bodies": 0, "runs": 0}
+
+    while True:
+        run_ids = [run_id for (run_id,) in
+                   db.session.query(RunSequence.id)
+                   .outerjoin(RunSummary, RunSummary.run_sequence == RunSequence.id)
+                   .filter(RunSequence.date < cutoff, RunSummary.run_sequence.is_(None))
+                   .limit(RETENTION_RUNS_PER_BATCH).all()]
+        if not run_ids:
+            break
+        roll_up(run_ids)
+        result["rolled_up"] += len(run_ids)
+
+    archived = db.session.query(RunSummary.run_sequence).scalar_subquery()
+    result["requests"] = delete_in_batches(
+        Request.query.filter(Request.run_sequence.in_(archived)), Request.id)
+
+    # Body non più referenziati e non riscritti dopo il cutoff.
+    unreferenced = RequestBody.query.filter(
+        RequestBody.last_seen < cutoff,
+        ~db.exists().where(Request.request_ref == RequestBody.hash),
+        ~db.exists().where(Request.response_ref == RequestBody.hash))
+    result["bodies"] = delete_in_batches(unreferenced, RequestBody.hash)
+
+    if summary_days:
+        summary_cutoff = datetime.now() - timedelta(days=summary_days)
+        while True:
+            runs = (RunSequence.query.join(RunSummary)
+                    .filter(RunSequence.date < summary_cutoff)
+                    .limit(RETENTION_RUNS_PER_BATCH).all())
+            if not runs:
+                break
+            for seq in runs:
+                # Le request sono già state rimosse: il cascade tocca solo i riepiloghi.
+                db.session.delete(seq)
+            db.session.commit()
+            result["runs"] += len(runs)
+            time.sleep(RETENTION_BATCH_PAUSE)
+    return result
+
+
+@app.cli.command("retention")
+@click.option("--days", type=int, default=RETENTION_DAYS, show_default=True,
+              help="Giorni di request complete da conservare.")
+@click.option("--summary-days", type=int, default=RETENTION_SUMMARY_DAYS, show_default=True,
+              help="Giorni dopo i quali eliminare anche i riepiloghi (0 = mai).")
+def retention_command(days: int, summary_days: int):
+    """Roll-up e purge dei run vecchi: flask --app app retention (es. da cron)."""
+    result = apply_retention(days, summary_days)
+    click.echo(f"Run archiviati: {result['rolled_up']}, request cancellate: {result['requests']}, "
+               f"body cancellati: {result['bodies']}, run eliminati: {result['runs']}")
+
+
 if __name__ == "__main__":
     app.run(debug=True)
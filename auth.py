@@ -1,21 +1,34 @@
 import os
+import threading
+import time
 from dotenv import load_dotenv
 import requests
 
 load_dotenv()
 
-def get_oauth2_bearer_token():
+# Seconds before expiry at which the token is refreshed proactively.
+TOKEN_REFRESH_MARGIN = int(os.environ.get("TOKEN_REFRESH_MARGIN", "30"))
+# Lifetime assumed when the IDM does not return expires_in.
+TOKEN_DEFAULT_EXPIRES_IN = int(os.environ.get("TOKEN_DEFAULT_EXPIRES_IN", "300"))
+# Seconds during which a failed fetch is not retried.
+TOKEN_RETRY_AFTER = float(os.environ.get("TOKEN_RETRY_AFTER", "5"))
+
+_session = requests.Session()
+
+
+def _request_token():
+    """Performs the client_credentials grant. Returns (token, expires_in) or (None, 0)."""
     idm_endpoint = os.environ.get("IDM_URL")
     client_id = os.environ.get("CLIENT_ID")
     client_secret = os.environ.get("CLIENT_SECRET")
-    
+
     if not all([idm_endpoint, client_id, client_secret]):
         missing = []
         if not idm_endpoint: missing.append("IDM_URL")
         if not client_id: missing.append("CLIENT_ID")
         if not client_secret: missing.append("CLIENT_SECRET")
         raise ValueError(f"Env variables missing: {', '.join(missing)}")
-    
+
     url = idm_endpoint
 
     payload = {
@@ -24,23 +37,116 @@ def get_oauth2_bearer_token():
         "grant_type": "client_credentials"
     }
 
-    response = requests.post(url, data=payload)
+    response = _session.post(url, data=payload)
 
     if response.status_code != 200:
         print("getTokenRequest failed:")
         print(f"Status Code: {response.status_code}")
         print(response.text)
-        return None
+        return None, 0
     else:
         response_body = response.text
 
         if not response_body:
             print("Empty response")
-            return None
+            return None, 0
         else:
             json_data = response.json()
             bearer_token = json_data.get("access_token")
-            return bearer_token
+            expires_in = int(json_data.get("expires_in") or TOKEN_DEFAULT_EXPIRES_IN)
+            return bearer_token, expires_in
+
+
+class TokenCache:
+    """Thread-safe bearer token cache.
+
+    The token is refreshed ``margin`` seconds before it expires, or at half
+    its lifetime for tokens shorter than twice the margin. Only one
+    thread talks to the IDM at a time: while a refresh is in flight the
+    others keep using the current token if it is still valid, otherwise
+    they wait for the refresh to complete.
+
+    A failed fetch is not retried for ``retry_after`` seconds: meanwhile
+    callers get the old token if still valid, otherwise the same failure
+    (None or the exception raised by the fetch).
+    """
+
+    def __init__(self, fetch=_request_token, margin: int = TOKEN_REFRESH_MARGIN,
+                 retry_after: float = TOKEN_RETRY_AFTER):
+        self._fetch = fetch
+        self._margin = margin
+        self._retry_after = retry_after
+        self._token = None
+        self._expires_at = 0.0
+        self._lifetime = 0.0
+        self._failed_until = 0.0
+        self._error = None
+        self._refreshing = False
+        self._cond = threading.Condition()
+
+    def get(self, force_refresh: bool = False):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                valid = self._token is not None and now < self._expires_at
+                margin = min(self._margin, self._lifetime / 2)
+                if valid and not force_refresh and now < self._expires_at - margin:
+                    return self._token
+                if now < self._failed_until:
+                    if valid:
+                        return self._token
+                    if self._error is not None:
+                        raise self._error
+                    return None
+                if not self._refreshing:
+                    break
+                if valid and not force_refresh:
+                    return self._token
+                self._cond.wait()
+                # A refresh completed while waiting: that one counts as forced.
+                force_refresh = False
+            self._refreshing = True
+
+        token, expires_in, error = None, 0, None
+        try:
+            token, expires_in = self._fetch()
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            with self._cond:
+                if token:
+                    self._token = token
+                    self._expires_at = time.monotonic() + expires_in
+                    self._lifetime = expires_in
+                    self._failed_until, self._error = 0.0, None
+                else:
+                    self._failed_until = time.monotonic() + self._retry_after
+                    self._error = error
+                self._refreshing = False
+                self._cond.notify_all()
+
+        if token:
+            return token
+        # Refresh failed: fall back on the old token while it is still valid.
+        with self._cond:
+            if self._token is not None and time.monotonic() < self._expires_at:
+                return self._token
+        return None
+
+    def clear(self):
+        with self._cond:
+            self._token = None
+            self._expires_at = 0.0
+            self._failed_until = 0.0
+            self._error = None
+
+
+_cache = TokenCache()
+
+
+def get_oauth2_bearer_token(force_refresh: bool = False):
+    return _cache.get(force_refresh=force_refresh)
 
 
 if __name__ == "__main__":
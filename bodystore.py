@@ -0,0 +1,153 @@
+"""Out-of-line storage of large request/response bodies.
+
+A body whose JSON is longer than ``BODY_INLINE_MAX`` bytes is not written in
+the ``request`` row: it goes to ``request_body``, compressed and keyed by
+the SHA-256 of its JSON, and the row keeps only the hash (``request_ref`` /
+``response_ref``). Identical bodies, e.g. the same listing returned by every
+run, are stored once.
+
+Blobs are compressed with zstd when the ``zstandard`` package is installed,
+gzip otherwise; the codec is stored with each blob, so both can be read.
+
+    python bodystore.py   # moves the large inline bodies of existing rows
+"""
+import datetime
+import gzip
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BODY_INLINE_MAX = int(os.environ.get("BODY_INLINE_MAX", "4096"))
+BODY_CODEC = os.environ.get("BODY_CODEC", "zstd" if zstandard is not None else "gzip")
+BODY_COMPACT_BATCH = int(os.environ.get("BODY_COMPACT_BATCH", "500"))
+
+# JSON column of the request table -> column holding the hash when out of line.
+REF_COLUMNS = {"request": "request_ref", "response": "response_ref"}
+
+CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS request_body (
+    hash CHAR(64) PRIMARY KEY,
+    codec VARCHAR(8) NOT NULL,
+    size INT NOT NULL,
+    data LONGBLOB NOT NULL,
+    last_seen DATETIME,
+    INDEX ix_request_body_last_seen (last_seen)
+)
+"""
+# Same hash, same content: a body already stored only gets its last_seen
+# refreshed, so that the retention purge does not delete it under a new row.
+INSERT_SQL = ("INSERT INTO request_body (hash, codec, size, data, last_seen) "
+              "VALUES (%s, %s, %s, %s, %s) "
+              "ON DUPLICATE KEY UPDATE last_seen = VALUES(last_seen)")
+
+
+@dataclass
+class Body:
+    hash: str
+    codec: str
+    size: int
+    data: bytes
+
+
+def compress(data: bytes, codec: str = BODY_CODEC) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    raise ValueError(f"unknown body codec: {codec}")
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("body stored with zstd: install the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "gzip":
+        return gzip.decompress(data)
+    raise ValueError(f"unknown body codec: {codec}")
+
+
+def out_of_line(text: str | None, inline_max: int = BODY_INLINE_MAX) -> Body | None:
+    """The compressed body for a serialised JSON value, None if it stays inline."""
+    if text is None:
+        return None
+    raw = text.encode("utf-8")
+    if len(raw) <= inline_max:
+        return None
+    return Body(hashlib.sha256(raw).hexdigest(), BODY_CODEC, len(raw), compress(raw))
+
+
+def load(codec: str, data: bytes):
+    """The JSON value of a stored body."""
+    return json.loads(decompress(data, codec))
+
+
+def store(cursor, bodies):
+    """Writes the bodies not yet in request_body, in the caller's transaction."""
+    last_seen = datetime.datetime.now().replace(microsecond=0)
+    values = [(b.hash, b.codec, b.size, b.data, last_seen) for b in bodies]
+    if values:
+        cursor.executemany(INSERT_SQL, values)
+
+
+def compact(conn, batch_size: int = BODY_COMPACT_BATCH) -> int:
+    """Moves the large inline bodies of existing request rows out of line.
+
+    Works in batches (one transaction each) and returns the number of rows
+    updated.
+    """
+    moved = 0
+    last_id = ""
+    while True:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id, request, request_ref, response, response_ref FROM request "
+            "WHERE id > %s AND (LENGTH(request) > %s OR LENGTH(response) > %s) "
+            "ORDER BY id LIMIT %s",
+            (last_id, BODY_INLINE_MAX, BODY_INLINE_MAX, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            cursor.close()
+            return moved
+
+        bodies = {}
+        updates = []
+        for row_id, request, request_ref, response, response_ref in rows:
+            values = []
+            for text, ref in ((request, request_ref), (response, response_ref)):
+                if isinstance(text, (bytes, bytearray)):
+                    text = text.decode("utf-8")
+                body = out_of_line(text)
+                if body is None:
+                    values += [text, ref]
+                else:
+                    bodies[body.hash] = body
+                    values += [None, body.hash]
+            updates.append((*values, row_id))
+        try:
+            store(cursor, bodies.values())
+            cursor.executemany(
+                "UPDATE request SET request = %s, request_ref = %s, "
+                "response = %s, response_ref = %s WHERE id = %s", updates)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        moved += len(updates)
+        last_id = rows[-1][0]
+
+
+if __name__ == "__main__":
+    import sink
+
+    conn = sink.connect()
+    sink.ensure_tables(conn)
+    print(f"Rows compacted: {compact(conn)} (codec {BODY_CODEC}, inline max {BODY_INLINE_MAX} bytes)")
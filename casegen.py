@@ -0,0 +1,462 @@
+"""Deterministic test cases from the request schemas of a spec.
+
+For every operation three cases are built without the LLM, as the
+generation prompt asks:
+
+- ``example``: the examples declared in the spec (schema-conforming values
+  where there are none);
+- ``valid``: values generated from the schemas (types, enums, formats,
+  required properties, min/max constraints);
+- ``invalid``: the valid payload with one constraint broken (a required
+  property missing, a wrong type, a value outside the enum or the range),
+  expecting a 4xx.
+
+The cases are rendered as ``runner.add`` registrations, one chunk per tag,
+and stitched into the usual Runner/ResultSink suite. Only the calls of a
+create -> read -> update -> delete chain (the ``example`` and the ``valid``
+case each create their own resource) share a group; the others run
+concurrently. Only operations the generator cannot handle (e.g. XML-only
+bodies, required cookies) are sent to the LLM, through
+``codegen.generate_chunks``.
+
+    python casegen.py openapi/example.yaml
+"""
+import datetime
+from dataclasses import dataclass, field
+from typing import Any
+
+from codegen import Chunk, chunk_operations, generate_chunks, stitch
+from spec import Operation, Spec
+
+_MAX_DEPTH = 6
+_METHOD_ORDER = {"POST": 0, "PUT": 1, "GET": 2, "HEAD": 2, "OPTIONS": 2, "PATCH": 3, "DELETE": 4}
+_IGNORED_HEADERS = {"authorization", "content-type", "accept"}
+_DEFAULT_ERRORS = (400, 404, 405, 422)
+
+_FORMATS = {
+    "date-time": "2024-01-01T00:00:00Z",
+    "date": "2024-01-01",
+    "time": "12:00:00",
+    "email": "test@example.com",
+    "uuid": "00000000-0000-4000-8000-000000000001",
+    "uri": "https://example.com/test",
+    "url": "https://example.com/test",
+    "hostname": "example.com",
+    "ipv4": "192.0.2.1",
+    "ipv6": "2001:db8::1",
+    "byte": "dGVzdA==",
+    "binary": "test",
+    "password": "Passw0rd!",
+}
+_INVALID_FORMATS = {"date-time": "not-a-date", "date": "not-a-date", "email": "not-an-email",
+                    "uuid": "not-a-uuid", "uri": "not a uri", "url": "not a url", "ipv4": "999.1.1"}
+
+
+@dataclass
+class Case:
+    name: str
+    path: str
+    params: dict = field(default_factory=dict)
+    headers: dict = field(default_factory=dict)
+    body: Any = None
+    expect: tuple = (200,)
+    # Creates the resource of its case, or reads/updates/deletes it.
+    chained: bool = False
+    # Parameter values the path, params and headers were built from.
+    values: dict = field(default_factory=dict)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Values
+# ──────────────────────────────────────────────────────────────────────────────
+def _merged(schema: dict) -> dict:
+    """allOf merged into one schema, first alternative of oneOf/anyOf."""
+    if not isinstance(schema, dict):
+        return {}
+    if "allOf" in schema:
+        merged = {k: v for k, v in schema.items() if k != "allOf"}
+        properties, required = dict(merged.get("properties") or {}), list(merged.get("required") or [])
+        for part in schema["allOf"]:
+            part = _merged(part)
+            properties.update(part.get("properties") or {})
+            required.extend(part.get("required") or [])
+            merged = {**part, **merged}
+        merged["properties"], merged["required"] = properties, required
+        return merged
+    for key in ("oneOf", "anyOf"):
+        if schema.get(key):
+            return _merged({**{k: v for k, v in schema.items() if k != key}, **schema[key][0]})
+    return schema
+
+
+def _type(schema: dict) -> str | None:
+    t = schema.get("type")
+    if isinstance(t, list):
+        t = next((x for x in t if x != "null"), None)
+    if t is None:
+        if "properties" in schema:
+            return "object"
+        if "items" in schema:
+            return "array"
+    return t
+
+
+def _number(schema: dict, integer: bool):
+    low, high = schema.get("minimum"), schema.get("maximum")
+    step = 1 if integer else 0.5
+    if isinstance(schema.get("exclusiveMinimum"), (int, float)):
+        low = schema["exclusiveMinimum"] + step
+    elif low is not None and schema.get("exclusiveMinimum") is True:
+        low += step
+    if isinstance(schema.get("exclusiveMaximum"), (int, float)):
+        high = schema["exclusiveMaximum"] - step
+    elif high is not None and schema.get("exclusiveMaximum") is True:
+        high -= step
+    value = low if low is not None else 1
+    if high is not None and value > high:
+        value = high
+    multiple = schema.get("multipleOf")
+    if multiple:
+        value = -(-value // multiple) * multiple
+    return int(value) if integer else float(value)
+
+
+def _string(schema: dict, name: str) -> str:
+    value = _FORMATS.get(schema.get("format"), f"test-{name}" if name else "test")
+    min_length, max_length = schema.get("minLength"), schema.get("maxLength")
+    if min_length and len(value) < min_length:
+        value = value + "x" * (min_length - len(value))
+    if max_length is not None and len(value) > max_length:
+        value = value[:max_length]
+    return value
+
+
+def valid_value(schema: dict, name: str = "", use_examples: bool = False, _depth: int = 0):
+    """A value conforming to ``schema``; with ``use_examples`` declared examples come first."""
+    schema = _merged(schema)
+    if use_examples:
+        for key in ("example", "default"):
+            if key in schema:
+                return schema[key]
+        if isinstance(schema.get("examples"), list) and schema["examples"]:
+            return schema["examples"][0]
+    if "const" in schema:
+        return schema["const"]
+    if schema.get("enum"):
+        return schema["enum"][0]
+
+    t = _type(schema)
+    if t == "object":
+        if _depth >= _MAX_DEPTH:
+            return {}
+        return {prop: valid_value(sub, prop, use_examples, _depth + 1)
+                for prop, sub in (schema.get("properties") or {}).items()
+                if not (sub or {}).get("readOnly")}
+    if t == "array":
+        if _depth >= _MAX_DEPTH:
+            return []
+        item = valid_value(schema.get("items") or {}, name, use_examples, _depth + 1)
+        return [item] * max(1, schema.get("minItems") or 1)
+    if t == "integer":
+        return _number(schema, integer=True)
+    if t == "number":
+        return _number(schema, integer=False)
+    if t == "boolean":
+        return True
+    if t == "string":
+        return _string(schema, name)
+    return f"test-{name}" if name else "test"
+
+
+def _plain(value):
+    """``value`` with the dates YAML parses in examples turned back into strings."""
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    return value
+
+
+def _distinct(value):
+    """Another value of the same kind, for a case that must not hit the same resource."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value + 1
+    if isinstance(value, str):
+        return f"{value}-2"
+    return value
+
+
+def invalid_value(schema: dict, name: str = ""):
+    """A value breaking one constraint of ``schema``; ``None`` when nothing can be broken.
+
+    Objects lose a required property (or get a wrongly typed one), enums get
+    a value outside the list, numbers go out of range, strings get a wrong
+    format or length, and anything else gets a value of the wrong type.
+    """
+    schema = _merged(schema)
+    t = _type(schema)
+    if t == "object":
+        value = valid_value(schema, name)
+        properties = schema.get("properties") or {}
+        for prop in schema.get("required") or []:
+            if prop in value:
+                del value[prop]
+                return value
+        for prop, sub in properties.items():
+            broken = invalid_value(sub, prop)
+            if broken is not None and prop in value:
+                value[prop] = broken
+                return value
+        return "not-an-object"
+    if schema.get("enum"):
+        return f"not-in-enum-{name}" if t in (None, "string") else -999999
+    if t in ("integer", "number"):
+        if schema.get("maximum") is not None:
+            return schema["maximum"] + 1
+        if schema.get("minimum") is not None:
+            return schema["minimum"] - 1
+        return f"not-a-number-{name}" if name else "not-a-number"
+    if t == "string":
+        if schema.get("format") in _INVALID_FORMATS:
+            return _INVALID_FORMATS[schema["format"]]
+        if schema.get("maxLength") is not None:
+            return "x" * (schema["maxLength"] + 1)
+        if schema.get("minLength"):
+            return "x" * (schema["minLength"] - 1)
+        return None
+    if t == "array":
+        if schema.get("maxItems") is not None:
+            return [valid_value(schema.get("items") or {}, name)] * (schema["maxItems"] + 1)
+        return "not-an-array"
+    if t == "boolean":
+        return "not-a-boolean"
+    return None
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Cases
+# ──────────────────────────────────────────────────────────────────────────────
+def _media_type(op: Operation) -> str | None:
+    content = op.request_content
+    if not content:
+        return None
+    return next((c for c in content if "json" in c), next(iter(content)))
+
+
+def supported(op: Operation) -> bool:
+    """Whether the cases of ``op`` can be built without the LLM."""
+    if op.request_body and _media_type(op) is not None:
+        media = _media_type(op)
+        if not ("json" in media or media in ("application/x-www-form-urlencoded",
+                                              "multipart/form-data",
+                                              "application/octet-stream")):
+            return False
+    return not any(p.required for p in op.params("cookie"))
+
+
+def _expected(op: Operation, success: bool) -> tuple:
+    codes = sorted(int(s) for s in op.responses if s.isdigit() and (s[0] == "2") == success)
+    if codes:
+        return tuple(codes)
+    if success:
+        return (200, 201, 202, 204)
+    return _DEFAULT_ERRORS
+
+
+def _created_value(p, created: dict | None):
+    """Value of path parameter ``p`` taken from the payload that created the resource."""
+    if p.location != "path" or not created or p.schema.get("enum"):
+        return None
+    if p.name in created:
+        return created[p.name]
+    if p.name.lower().endswith("id"):
+        return created.get("id")
+    return None
+
+
+def _param_value(p, case: str, created: dict | None):
+    value = _created_value(p, created)
+    if value is not None:
+        return value
+    if case == "example" and p.example is not None:
+        return p.example
+    return valid_value(p.schema, p.name, use_examples=case == "example")
+
+
+def _invalid_param(p):
+    """A broken value for a path/query parameter that is still broken once in the URL."""
+    schema = _merged(p.schema)
+    if _type(schema) == "array" and schema.get("maxItems") is None:
+        # "not-an-array" is a valid one-element array in a query string.
+        item = invalid_value(schema.get("items") or {}, p.name)
+        return [item] if item is not None else None
+    return invalid_value(schema, p.name)
+
+
+def build_cases(op: Operation, ids: dict | None = None) -> list[Case]:
+    """The example / valid / invalid cases of ``op``.
+
+    ``ids`` maps each case to the last payload with an ``id`` it sent for
+    the same resource, so that ``/pet/{petId}`` reads the pet created by
+    the same case. The two cases use different ids, and two deletes never
+    target the same resource.
+    """
+    ids = ids if ids is not None else {}
+    schema = op.request_schema or {}
+    cases = []
+    for name in ("example", "valid"):
+        created = ids.get(name)
+        values = {p.name: _param_value(p, name, created) for p in op.parameters}
+        chained = any(_created_value(p, created) is not None for p in op.parameters)
+        body = None
+        if op.request_body:
+            examples = op.request_examples if name == "example" else []
+            body = examples[0] if examples else valid_value(schema, use_examples=name == "example")
+            if isinstance(body, dict) and "id" in body:
+                if name == "valid" and body["id"] == ids.get("example", {}).get("id"):
+                    body = {**body, "id": _distinct(body["id"])}
+                ids[name] = body
+                chained = True
+        if name == "valid" and op.method == "DELETE" and _plain(values) == cases[0].values:
+            values = {p.name: _distinct(v) if p.location == "path" else v
+                      for p, v in zip(op.parameters, values.values())}
+        cases.append(_case(op, name, values, body, _expected(op, success=True), chained))
+
+    # Invalid: one broken constraint in the body, otherwise in a parameter.
+    values = {p.name: _param_value(p, "valid", ids.get("valid")) for p in op.parameters}
+    body = valid_value(schema) if op.request_body else None
+    broken = invalid_value(schema) if op.request_body and _type(_merged(schema)) else None
+    if broken is not None:
+        body = broken
+    else:
+        for p in op.parameters:
+            value = _invalid_param(p)
+            if value is not None and p.location in ("path", "query"):
+                values[p.name] = value
+                break
+        else:
+            return cases
+    cases.append(_case(op, "invalid", values, body, _expected(op, success=False)))
+    return cases
+
+
+def _case(op: Operation, name: str, values: dict, body, expect: tuple,
+          chained: bool = False) -> Case:
+    values, body = _plain(values), _plain(body)
+    path = op.path
+    params, headers = {}, {}
+    for p in op.parameters:
+        value = values.get(p.name)
+        if p.location == "path":
+            path = path.replace("{" + p.name + "}", str(value))
+        elif p.location == "query":
+            params[p.name] = value
+        elif p.location == "header" and p.name.lower() not in _IGNORED_HEADERS and p.required:
+            headers[p.name] = str(value)
+    return Case(name=name, path=path, params=params, headers=headers, body=body, expect=expect,
+                values=values, chained=chained)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Code
+# ──────────────────────────────────────────────────────────────────────────────
+def _body_args(op: Operation, body) -> tuple[list[str], dict]:
+    """``runner.add`` arguments for the body, and the headers it needs."""
+    if body is None:
+        return [], {}
+    media = _media_type(op) or "application/json"
+    if "json" in media:
+        return [f"json={repr(body)}"], {}
+    if media == "application/x-www-form-urlencoded":
+        return [f"data={repr(body)}"], {}
+    if media == "multipart/form-data":
+        files = {k: (None, v if isinstance(v, str) else str(v))
+                 for k, v in (body.items() if isinstance(body, dict) else {"file": body}.items())}
+        return [f"files={repr(files)}"], {}
+    data = body if isinstance(body, (str, bytes)) else str(body)
+    raw = data.encode() if isinstance(data, str) else data
+    # Raw bytes cannot go in the JSON request column: record what was sent instead.
+    recorded = {"content_type": media, "size": len(raw)}
+    return [f"data={raw!r}", f"request={recorded!r}"], {"Content-Type": media}
+
+
+def render_call(op: Operation, case: Case, group: str | None = None) -> str:
+    args = [repr(op.path), repr(op.method)]
+    if case.path != op.path:
+        args.append(f"path={case.path!r}")
+    if case.params:
+        args.append(f"params={repr(case.params)}")
+    body_args, body_headers = _body_args(op, case.body)
+    args.extend(body_args)
+    headers = {**case.headers, **body_headers}
+    if headers:
+        args.append(f"headers={repr(headers)}")
+    if not op.security:
+        args.append("auth=False")
+    args.append(f"expect={case.expect!r}")
+    if group is not None:
+        args.append(f"group={group!r}")
+    args.append(f"variant={case.name!r}")
+    return f"# {case.name}\nrunner.add({', '.join(args)})"
+
+
+def _resource(op: Operation) -> str:
+    parts = [p for p in op.path.split("/") if p and not p.startswith("{")]
+    return parts[0] if parts else "root"
+
+
+def chunk_code(chunk: Chunk) -> str:
+    """``runner.add`` registrations of every case of the chunk's operations.
+
+    The chained calls of a resource share one group per case (e.g.
+    ``pet-example``) and run create -> read -> update -> delete, so reads
+    and deletes find the resource just created; the other calls get no
+    group and run concurrently.
+    """
+    lines, ids = [], {}
+    ordered = sorted(chunk.operations,
+                     key=lambda op: (_resource(op), _METHOD_ORDER.get(op.method, 2), "{" in op.path))
+    for op in ordered:
+        resource = _resource(op)
+        resource_ids = ids.setdefault(resource, {})
+        lines.append(f"# ── {op.method} {op.path}")
+        lines.extend(render_call(op, case, f"{resource}-{case.name}" if case.chained else None)
+                     for case in build_cases(op, resource_ids))
+    return "\n".join(lines)
+
+
+def generate_suite(spec: Spec, llm=None, by: str = "tag") -> str:
+    """Suite with deterministic cases; chunks with unsupported operations go to the LLM.
+
+    Without an ``llm`` those chunks are skipped (reported as a comment in the suite).
+    """
+    chunks = chunk_operations(spec, by)
+    codes: list[str | None] = [None] * len(chunks)
+    for_llm = []
+    for i, chunk in enumerate(chunks):
+        if all(supported(op) for op in chunk.operations):
+            codes[i] = chunk_code(chunk)
+        else:
+            for_llm.append(i)
+    if for_llm and llm is not None:
+        generated = generate_chunks(spec, [chunks[i] for i in for_llm], llm)
+        for i, code in zip(for_llm, generated):
+            codes[i] = code
+    return stitch(spec, chunks, codes)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    from spec import load_spec
+
+    spec = load_spec(sys.argv[1] if len(sys.argv) > 1 else "openapi/example.yaml")
+    start = time.perf_counter()
+    suite = generate_suite(spec)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(suite)
+    print(f"# {len(spec.operations)} operations in {elapsed:.1f} ms", file=sys.stderr)
+
@@ -0,0 +1,100 @@
+"""Content-addressed cache of generated test code.
+
+The key is a hash of the normalised spec (parsed and re-serialised, so
+formatting and key order do not matter), the prompt template, the model
+and the generation mode. Only code that executed successfully is stored;
+a re-upload of the same spec skips the LLM and runs the cached code.
+"""
+import hashlib
+import json
+import os
+import time
+
+import yaml
+
+CODE_CACHE_DIR = os.environ.get("CODE_CACHE_DIR",
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "code"))
+CODE_CACHE_MAX_ENTRIES = int(os.environ.get("CODE_CACHE_MAX_ENTRIES", "200"))
+CODE_CACHE_MAX_AGE_DAYS = float(os.environ.get("CODE_CACHE_MAX_AGE_DAYS", "30"))
+
+
+def spec_hash(spec_text: str) -> str:
+    """Hash of the spec content, independent of formatting and key order."""
+    try:
+        doc = yaml.safe_load(spec_text)
+    except yaml.YAMLError:
+        doc = spec_text
+    canonical = json.dumps(doc, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def cache_key(spec_text: str, prompt: str, model: str, mode: str) -> str:
+    h = hashlib.sha256()
+    for part in (spec_hash(spec_text), prompt, model, mode):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class CodeCache:
+    def __init__(self, directory: str = CODE_CACHE_DIR,
+                 max_entries: int = CODE_CACHE_MAX_ENTRIES,
+                 max_age_days: float = CODE_CACHE_MAX_AGE_DAYS):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.py")
+
+    def get(self, key: str) -> str | None:
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                self.invalidate(key)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                code = f.read()
+        except FileNotFoundError:
+            return None
+        # mtime doubles as last-use time for the LRU eviction.
+        os.utime(path)
+        return code
+
+    def put(self, key: str, code: str):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(code)
+        os.replace(tmp, path)
+        self.evict()
+
+    def invalidate(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """Drops entries older than max_age, then the least recently used beyond max_entries."""
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".py"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                mtime = os.path.getmtime(path)
+            except FileNotFoundError:
+                continue
+            if now - mtime > self.max_age:
+                os.remove(path)
+            else:
+                entries.append((mtime, path))
+        entries.sort(reverse=True)
+        for _, path in entries[self.max_entries:]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,184 @@
+"""Chunked generation of the test suite.
+
+The spec is split by tag (or by single operation); each chunk is sent to the
+LLM as a standalone spec fragment, with bounded concurrency, and asked only
+for the ``runner.add`` registrations of its operations. The fragments are
+then stitched into one runnable script around a shared Runner/ResultSink,
+each inside its own function so helper names cannot clash.
+
+A suite with a chunk that was skipped or raised still runs the others, but
+does not end with the request count: the run is not taken as successful,
+so it is repaired instead of being cached.
+"""
+import ast
+import os
+import re
+import textwrap
+from dataclasses import dataclass, field
+from functools import cache
+
+import yaml
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from spec import Operation, Spec
+
+GENERATION_CONCURRENCY = int(os.environ.get("GENERATION_CONCURRENCY", "4"))
+
+
+@cache
+def get_chunk_instructions() -> str:
+    with open("prompts/code_chunk_generator.prompt", "r", encoding="utf-8") as file:
+        return file.read()
+
+
+@cache
+def get_chunk_prompt() -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_template(template=get_chunk_instructions())
+
+
+_FENCE = re.compile(r"```(?:python|py)?\s*\n(.*?)```", re.DOTALL)
+
+SUITE_HEADER = '''import sys
+import traceback
+import uuid
+
+from runner import Runner
+from sink import ResultSink
+
+BASE_URL = {base_url!r}
+
+run_id = globals().get("RUN_SEQUENCE_ID") or str(uuid.uuid4())
+sink = ResultSink(run_id)
+sink.start_run()
+runner = Runner(BASE_URL, on_result=sink.add, spec=globals().get("SPEC_PATH"))
+'''
+
+SUITE_FOOTER = '''
+_failed = list(SKIPPED)
+for _name, _register in CHUNKS:
+    try:
+        _register(runner)
+    except Exception:
+        print(f"Chunk {_name} failed:")
+        traceback.print_exc(file=sys.stdout)
+        _failed.append(_name)
+
+runner.run()
+sink.close()
+if _failed:
+    print(f"{sink.count} requests recorded; chunks failed: {', '.join(_failed)}")
+else:
+    print(sink.count)
+'''
+
+
+@dataclass
+class Chunk:
+    name: str
+    operations: list = field(default_factory=list)
+
+
+def chunk_operations(spec: Spec, by: str = "tag") -> list[Chunk]:
+    """Groups operations by their first tag, or one chunk per operation."""
+    if by == "operation":
+        return [Chunk(op.operation_id or f"{op.method} {op.path}", [op])
+                for op in spec.operations]
+    chunks: dict[str, Chunk] = {}
+    for op in spec.operations:
+        tag = op.tags[0] if op.tags else "default"
+        chunks.setdefault(tag, Chunk(tag)).operations.append(op)
+    return list(chunks.values())
+
+
+def strip_code_fences(text: str) -> str:
+    match = _FENCE.search(text)
+    return (match.group(1) if match else text).strip()
+
+
+def _compiles(code) -> bool:
+    if not isinstance(code, str):
+        return False
+    try:
+        compile(code, "<chunk>", "exec")
+        return True
+    except SyntaxError:
+        return False
+
+
+def fragment_text(spec: Spec, operations: list[Operation]) -> str:
+    return yaml.safe_dump(spec.fragment(operations), sort_keys=False, allow_unicode=True)
+
+
+def generate_chunks(spec: Spec, chunks: list[Chunk], llm,
+                    max_concurrency: int = GENERATION_CONCURRENCY) -> list[str | None]:
+    """Generates the code of every chunk; chunks that fail twice are returned as None."""
+    chain = get_chunk_prompt() | llm | StrOutputParser()
+    inputs = [{"file_text": fragment_text(spec, c.operations)} for c in chunks]
+    config = {"max_concurrency": max_concurrency}
+
+    codes = [strip_code_fences(c) if isinstance(c, str) else c
+             for c in chain.batch(inputs, config=config, return_exceptions=True)]
+
+    # One retry for chunks that errored or do not compile.
+    failed = [i for i, code in enumerate(codes) if not _compiles(code)]
+    if failed:
+        retried = chain.batch([inputs[i] for i in failed], config=config, return_exceptions=True)
+        for i, code in zip(failed, retried):
+            codes[i] = strip_code_fences(code) if isinstance(code, str) else code
+
+    return [code if _compiles(code) else None for code in codes]
+
+
+def stitch(spec: Spec, chunks: list[Chunk], codes: list[str | None]) -> str:
+    """Builds the runnable suite from the generated chunk bodies."""
+    parts = [SUITE_HEADER.format(base_url=spec.servers[0] if spec.servers else "")]
+    registered = []
+    skipped = []
+    for i, (chunk, code) in enumerate(zip(chunks, codes)):
+        if code is None:
+            parts.append(f"# chunk {chunk.name!r} skipped: code generation failed\n")
+            skipped.append(chunk.name)
+            continue
+        parts.append(f"\n# ── chunk: {chunk.name} "
+                     f"({len(chunk.operations)} operations) ──\n"
+                     f"def _chunk_{i}(runner):\n"
+                     f"{textwrap.indent(code, '    ')}\n"
+                     f"    pass\n")
+        registered.append(f"    ({chunk.name!r}, _chunk_{i}),")
+    parts.append("\nCHUNKS = [\n" + "\n".join(registered) + "\n]\n")
+    parts.append(f"SKIPPED = {skipped!r}\n")
+    parts.append(SUITE_FOOTER)
+    return "".join(parts)
+
+
+def generate_suite(spec: Spec, llm, by: str = "tag",
+                   max_concurrency: int = GENERATION_CONCURRENCY) -> str:
+    chunks = chunk_operations(spec, by)
+    codes = generate_chunks(spec, chunks, llm, max_concurrency)
+    return stitch(spec, chunks, codes)
+
+
+def unstitch(suite: str) -> dict[str, str]:
+    """Inverse of ``stitch``: the code of each chunk of a suite, by chunk name."""
+    tree = ast.parse(suite)
+    functions, names = {}, {}
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name.startswith("_chunk_"):
+            functions[node.name] = node
+        elif (isinstance(node, ast.Assign) and isinstance(node.value, ast.List)
+              and any(isinstance(t, ast.Name) and t.id == "CHUNKS" for t in node.targets)):
+            for elt in node.value.elts:
+                chunk_name, fn = elt.elts
+                names[fn.id] = chunk_name.value
+
+    lines = suite.splitlines()
+    codes = {}
+    for fn_name, chunk_name in names.items():
+        node = functions[fn_name]
+        body = lines[node.body[0].lineno - 1:node.end_lineno]
+        # The trailing "pass" is added by stitch.
+        if body and body[-1].strip() == "pass":
+            body = body[:-1]
+        codes[chunk_name] = textwrap.dedent("\n".join(body)).strip()
+    return codes
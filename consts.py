@@ -1,3 +1,4 @@
 REACT_AGENT = "react_agent"
 CLIENT_EXECUTOR_TOOL = "client_executor_tool"
-EXECUTOR = "executor"
\ No newline at end of file
+EXECUTOR = "executor"
+REPAIR = "repair"
\ No newline at end of file
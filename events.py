@@ -0,0 +1,112 @@
+"""In-process pub/sub of run progress, one topic per run id.
+
+Producers publish dict events (graph node transitions, recorded request
+rows, job status); the SSE endpoint subscribes to a run and streams them.
+Each topic keeps its recent history so a subscriber that connects late
+first receives what it missed. Topics are dropped some time after their
+``end`` event; a topic that only had subscribers (unknown or finished run)
+is dropped with its last subscriber.
+
+Generated code runs in other processes (subprocess/pool backends): there
+the sink writes events to stdout as ``EVENT_PREFIX + json`` lines, and the
+parent relays them with ``relay_line`` while streaming the output.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+EVENTS_HISTORY = int(os.environ.get("EVENTS_HISTORY", "1000"))
+EVENTS_TTL = float(os.environ.get("EVENTS_TTL", "300"))
+EVENT_PREFIX = "@@run-event "
+# Set in the environment of subprocesses whose events go through stdout.
+RELAY_ENV = "RUN_EVENTS_STDOUT"
+
+
+class _Topic:
+    def __init__(self):
+        self.history: deque = deque(maxlen=EVENTS_HISTORY)
+        self.subscribers: list[queue.Queue] = []
+        self.ended_at: float | None = None
+
+
+class EventBus:
+    def __init__(self):
+        self._topics: dict[str, _Topic] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, topic: str | None, event: dict):
+        if not topic:
+            return
+        event = {**event, "ts": time.time()}
+        with self._lock:
+            self._expire()
+            t = self._topics.setdefault(topic, _Topic())
+            t.history.append(event)
+            if event.get("type") == "end":
+                t.ended_at = time.time()
+            subscribers = list(t.subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                pass  # slow consumer: the event stays in the history only
+
+    def subscribe(self, topic: str, maxsize: int = 10000) -> queue.Queue:
+        """Queue receiving the topic history followed by new events."""
+        q: queue.Queue = queue.Queue(maxsize=maxsize)
+        with self._lock:
+            self._expire()
+            t = self._topics.setdefault(topic, _Topic())
+            for event in t.history:
+                q.put_nowait(event)
+            t.subscribers.append(q)
+        return q
+
+    def unsubscribe(self, topic: str, q: queue.Queue):
+        with self._lock:
+            t = self._topics.get(topic)
+            if t is not None and q in t.subscribers:
+                t.subscribers.remove(q)
+                if not t.subscribers and not t.history:
+                    del self._topics[topic]
+
+    def _expire(self):
+        now = time.time()
+        for name in [name for name, t in self._topics.items()
+                     if not t.subscribers and (not t.history or t.ended_at is not None
+                                               and now - t.ended_at > EVENTS_TTL)]:
+            del self._topics[name]
+
+
+bus = EventBus()
+
+
+def publish(run_id: str | None, event_type: str, **data):
+    bus.publish(run_id, {"type": event_type, **data})
+
+
+def encode(event: dict) -> str:
+    """Event line written by generated code to stdout."""
+    return EVENT_PREFIX + json.dumps(event, default=str)
+
+
+def relay_line(run_id: str | None, line: str) -> bool:
+    """Publishes ``line`` if it is an event line; returns whether it was one."""
+    if not line.startswith(EVENT_PREFIX):
+        return False
+    try:
+        event = json.loads(line[len(EVENT_PREFIX):])
+    except ValueError:
+        return False
+    bus.publish(run_id, event)
+    return True
+
+
+def strip_event_lines(output: str) -> str:
+    """Output of generated code without the relayed event lines."""
+    if EVENT_PREFIX not in output:
+        return output
+    return "".join(line for line in output.splitlines(True) if not line.startswith(EVENT_PREFIX))
@@ -1,58 +1,296 @@
+import os
+import time
+from functools import lru_cache
 
 from langchain_core.agents import AgentFinish
 from langgraph.graph import END, StateGraph
 from dotenv import load_dotenv
 from state import AgentState
-from node import run_agent_reasoning_engine, run_pythonREPLTool
-from node import execute_tools
+from node import run_agent_reasoning_engine, run_pythonREPLTool, run_repair
+from node import execute_tools, execute_code, looks_successful
+from node import MODEL, GENERATION_MODE, EXECUTION_BACKEND, get_instructions, get_llm
+from pool import get_pool
+from codecache import CodeCache, cache_key
+from llmcache import get_llm_cache, refreshing
+import casegen
+import events
+from codegen import chunk_operations, get_chunk_instructions, generate_chunks, stitch, unstitch
+from spec import SpecError, parse_spec
+from specdiff import SpecStore, api_key, diff, fingerprints, make_version, reusable_code
 from langchain_community.document_loaders import TextLoader
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import HumanMessage
 
-from consts import CLIENT_EXECUTOR_TOOL, REACT_AGENT, EXECUTOR
+from consts import CLIENT_EXECUTOR_TOOL, REACT_AGENT, EXECUTOR, REPAIR
 
 
 load_dotenv()
 
 max_iterations = 4
 
-def should_continue(state: AgentState) -> str:
-    iteration = state.get("iteration", 0)
-    if isinstance(state["agent_outcome"], AgentFinish) or iteration >= max_iterations:
-        return END
-    else:
-        state["number_iterations"] = iteration + 1
+NODES = {
+    REACT_AGENT: run_agent_reasoning_engine,
+    CLIENT_EXECUTOR_TOOL: execute_tools,
+    EXECUTOR: run_pythonREPLTool,
+    REPAIR: run_repair,
+}
+
+
+def make_should_continue(max_iterations: int):
+    def should_continue(state: AgentState) -> str:
+        iteration = state.get("iteration", 0)
+        if isinstance(state["agent_outcome"], AgentFinish) or iteration >= max_iterations:
+            return END
+        if state.get("stop_reason"):
+            return END
         return CLIENT_EXECUTOR_TOOL
+    return should_continue
+
+
+def make_router(next_node: str):
+    """Routes to next_node unless a node asked to stop the run."""
+    def route(state: AgentState) -> str:
+        return END if state.get("stop_reason") else next_node
+    return route
+
+
+def make_after_executor(max_iterations: int, repair: bool = True):
+    """A failed execution goes to the repair node while attempts remain."""
+    def after_executor(state: AgentState) -> str:
+        if state.get("stop_reason"):
+            return END
+        if repair and state.get("last_error") and state.get("iteration", 0) < max_iterations:
+            return REPAIR
+        return REACT_AGENT
+    return after_executor
+
+
+def after_repair(state: AgentState) -> str:
+    if state.get("stop_reason"):
+        return END
+    return EXECUTOR if state.get("repaired") else REACT_AGENT
+
+
+should_continue = make_should_continue(max_iterations)
 
-def start_agentic_flow(file_path: str):
+# Archi condizionali dopo ogni nodo: il router di REACT_AGENT conta i tentativi,
+# gli altri fermano il run quando un nodo valorizza stop_reason. Un'esecuzione
+# fallita passa dal nodo di repair (se presente) prima di rigenerare tutto.
+ROUTERS = {
+    REACT_AGENT: lambda max_iterations, nodes: make_should_continue(max_iterations),
+    CLIENT_EXECUTOR_TOOL: lambda max_iterations, nodes: make_router(EXECUTOR),
+    EXECUTOR: lambda max_iterations, nodes: make_after_executor(max_iterations, REPAIR in nodes),
+    REPAIR: lambda max_iterations, nodes: after_repair,
+}
+
+
+def published(name: str, fn):
+    """Wraps a node so that its start and end are published on the run's topic."""
+    def node(state: AgentState):
+        run_id = state.get("run_id")
+        events.publish(run_id, "node", node=name, phase="start", iteration=state.get("iteration", 0))
+        try:
+            result = fn(state)
+        except Exception as e:
+            events.publish(run_id, "node", node=name, phase="error", error=f"{type(e).__name__}: {e}")
+            raise
+        events.publish(run_id, "node", node=name, phase="end",
+                       stop_reason=(result or {}).get("stop_reason"))
+        return result
+    return node
+
+
+def build_graph(nodes: dict, max_iterations: int = max_iterations):
+    """Builds and compiles the StateGraph for the given node callables."""
     flow = StateGraph(AgentState)
     flow.set_entry_point(REACT_AGENT)
-    flow.add_node(REACT_AGENT, run_agent_reasoning_engine)
-    flow.add_node(CLIENT_EXECUTOR_TOOL, execute_tools)
-    flow.add_node(EXECUTOR, run_pythonREPLTool)
+    for name, fn in nodes.items():
+        flow.add_node(name, published(name, fn))
 
-    
-    flow.add_conditional_edges(
-        REACT_AGENT,
-        should_continue,
-    )
-    flow.add_edge(CLIENT_EXECUTOR_TOOL, EXECUTOR)
-    flow.add_edge(EXECUTOR,REACT_AGENT)
-    
+    for name in nodes:
+        flow.add_conditional_edges(name, ROUTERS[name](max_iterations, nodes))
 
-    app = flow.compile()
-    #app.get_graph().draw_mermaid_png(output_file_path="graph.png")
+    return flow.compile()
+
+
+@lru_cache(maxsize=8)
+def _compiled_graph(max_iterations: int, node_names: tuple):
+    # The model is not part of the key: the nodes use node.get_llm(), built from MODEL.
+    return build_graph({name: NODES[name] for name in node_names}, max_iterations)
+
+
+def get_graph(max_iterations: int = max_iterations,
+              node_names: tuple = tuple(NODES)):
+    """Returns the compiled graph for this configuration, compiling it once."""
+    return _compiled_graph(max_iterations, node_names)
+
+
+def warm_up():
+    """Compiles the default graph ahead of the first run (called at app startup).
 
+    With EXECUTION_BACKEND=pool the interpreters are started here too, so
+    the first run does not pay for their startup.
+    """
+    get_graph()
+    if EXECUTION_BACKEND == "pool":
+        get_pool()
+
+
+code_cache = CodeCache()
+spec_store = SpecStore()
+
+
+def code_cache_key(file_text: str) -> str:
+    prompt = get_instructions() if GENERATION_MODE == "single" else get_chunk_instructions()
+    return cache_key(file_text, prompt, MODEL, GENERATION_MODE)
+
+
+def successful_code(steps: list) -> str | None:
+    """Last generated code whose execution succeeded.
+
+    execute_tools appends the generated code and run_pythonREPLTool the
+    execution output, so steps come in (code, output) pairs.
+    """
+    for i in range(len(steps) - 1, 0, -1):
+        output = steps[i][1]
+        if i % 2 == 1 and looks_successful(output):
+            return steps[i - 1][1]
+    return None
+
+
+def run_incremental(file_text: str, run_id: str | None, spec_path: str | None = None) -> bool:
+    """Regenerates and runs only the chunks whose operations changed.
+
+    Needs a chunked GENERATION_MODE and a stored previous version of the
+    same API; returns False when the full flow has to run instead.
+    """
+    if GENERATION_MODE not in ("tag", "operation"):
+        return False
+    try:
+        spec = parse_spec(file_text)
+    except SpecError:
+        return False
+    key = api_key(spec)
+    previous = spec_store.load(key)
+    if previous is None:
+        return False
+    events.publish(run_id, "stage", stage="incremental")
+
+    fps = fingerprints(spec)
+    print(f"Spec diff: {diff(previous['fingerprints'], fps)}")
+
+    chunks = chunk_operations(spec, GENERATION_MODE)
+    codes = {c.name: reusable_code(previous, c, fps) for c in chunks}
+    stale = [c for c in chunks if codes[c.name] is None]
+    if stale:
+        generated = generate_chunks(spec, stale, get_llm())
+        if any(code is None for code in generated):
+            return False
+        codes.update({c.name: code for c, code in zip(stale, generated)})
+        to_run = stale
+    else:
+        # Nessuna operazione cambiata (es. solo descrizioni): si riesegue tutto.
+        to_run = chunks
+
+    output = execute_code(stitch(spec, to_run, [codes[c.name] for c in to_run]), run_id, spec_path)
+    if not looks_successful(output):
+        return False
+    spec_store.save(key, make_version(fps, chunks, codes))
+    print(output)
+    return True
+
+
+def run_schema_suite(file_text: str, run_id: str | None, spec_path: str | None = None,
+                     force: bool = False) -> str | None:
+    """Runs the suite built from the schemas, without the agent.
+
+    Returns the code when it executed successfully; otherwise the agent
+    takes over (and can repair it). With ``force`` the operations left to
+    the LLM are generated again instead of being read from the LLM cache.
+    """
+    try:
+        spec = parse_spec(file_text)
+    except SpecError:
+        return None
+    with refreshing(force):
+        code = casegen.generate_suite(spec, get_llm())
+    output = execute_code(code, run_id, spec_path)
+    if not looks_successful(output):
+        return None
+    print(output)
+    return code
+
+
+def remember_version(file_text: str, code: str):
+    """Stores the chunks of a successful suite as the last version of the API."""
+    if GENERATION_MODE not in ("tag", "operation"):
+        return
+    try:
+        spec = parse_spec(file_text)
+    except SpecError:
+        return
+    chunks = chunk_operations(spec, GENERATION_MODE)
+    spec_store.save(api_key(spec), make_version(fingerprints(spec), chunks, unstitch(code)))
+
+
+def start_agentic_flow(file_path: str, run_id: str | None = None, force: bool = False):
+    """Generates and runs the test suite of a spec.
+
+    ``force`` skips the code cache and the incremental path, and calls the
+    LLM again instead of reusing its cached answers.
+    """
     loader = TextLoader(file_path= file_path, encoding="utf8")
     documents = loader.load()
     file_text = documents[0].page_content
+    spec_path = os.path.abspath(file_path)
+
+    key = code_cache_key(file_text)
+    if not force:
+        code = code_cache.get(key)
+        if code is not None:
+            events.publish(run_id, "stage", stage="code_cache")
+            output = execute_code(code, run_id, spec_path)
+            if looks_successful(output):
+                print(output)
+                return
+            # Il codice in cache non funziona più (es. API cambiata): si rigenera.
+            code_cache.invalidate(key)
+        if run_incremental(file_text, run_id, spec_path):
+            return
+
+    if GENERATION_MODE == "schema":
+        events.publish(run_id, "stage", stage="schema_suite")
+        code = run_schema_suite(file_text, run_id, spec_path, force)
+        if code is not None:
+            code_cache.put(key, code)
+            return
+
+    events.publish(run_id, "stage", stage="agent")
+    app = get_graph()
+    #app.get_graph().draw_mermaid_png(output_file_path="graph.png")
     
     input = HumanMessage(content=f"""Voglio creare ed eseguire un applicazione di test di queste API: {file_path}, 
                          se ci sono errori correggili rigenerando il codice e rieseguelo. Se l'applicazione deve ritornare
                          il mumero di record salvati nel DB, se il dato non è presente rigenera il codice e riesegui""")
     
     res = app.invoke({"input": input,
-                      "file_text": file_text})    
+                      "file_text": file_text,
+                      "run_id": run_id,
+                      "spec_path": spec_path,
+                      "force": force,
+                      "iteration": 0,
+                      "started_at": time.time(),
+                      "tokens_used": 0})    
+    if res.get("stop_reason"):
+        print(f"Run stopped early: {res['stop_reason']}")
+    llm_cache = get_llm_cache()
+    if llm_cache is not None:
+        print(f"LLM cache: {llm_cache.stats()}")
+    code = successful_code(res.get("intermediate_steps", []))
+    # Il codice corretto dal nodo repair non va in cache: al prossimo run si
+    # rigenera (e se serve si ripara) invece di riusare una toppa.
+    if code is not None and not res.get("repaired"):
+        code_cache.put(key, code)
+        remember_version(file_text, code)
     print(res["agent_outcome"])    
 
 if __name__ == "__main__":
@@ -0,0 +1,53 @@
+"""Startup-time report: import cost per module.
+
+Runs ``python -X importtime -c "import <module>"`` in a fresh interpreter and
+prints the slowest top-level packages (self time summed over submodules) and
+the slowest single imports (cumulative time).
+
+    python import_report.py [module] [top]
+"""
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)")
+
+
+def measure(module: str = "app") -> list[tuple[str, int, int]]:
+    """(name, self_us, cumulative_us) for every module imported."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr[-2000:])
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def report(module: str = "app", top: int = 20):
+    rows = measure(module)
+    if not rows:
+        return
+    packages = defaultdict(int)
+    for name, self_us, _ in rows:
+        packages[name.split(".")[0]] += self_us
+    total = sum(packages.values())
+
+    print(f"import {module}: {total / 1000:.1f} ms, {len(rows)} modules\n")
+    print(f"{'package':<40}{'self ms':>10}{'share':>8}")
+    for name, us in sorted(packages.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"{name:<40}{us / 1000:>10.1f}{us / total:>8.1%}")
+
+    print(f"\n{'module':<40}{'cumulative ms':>14}")
+    for name, _, cumulative_us in sorted(rows, key=lambda r: -r[2])[:top]:
+        print(f"{name:<40}{cumulative_us / 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    report(sys.argv[1] if len(sys.argv) > 1 else "app",
+           int(sys.argv[2]) if len(sys.argv) > 2 else 20)
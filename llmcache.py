@@ -0,0 +1,258 @@
+"""Exact-match cache of LLM responses.
+
+With temperature 0 the same model and prompt give the same answer, so the
+response is stored under a hash of the LangChain ``llm_string`` (model and
+call parameters, stop sequences included) and of the full prompt. Entries
+expire after ``LLM_CACHE_TTL`` seconds and the least recently used ones are
+evicted beyond ``LLM_CACHE_MAX_ENTRIES``.
+
+The store is a local SQLite file (default) or the report MySQL DB:
+
+    LLM_CACHE=sqlite|mysql|off
+
+Inside ``refreshing()`` lookups are skipped and the new responses replace
+the cached ones: used to regenerate code whose cached version failed.
+
+Hits, misses, expirations, evictions and refreshes are counted in ``stats()``.
+
+    python llmcache.py   # offline demo with a fake chat model (tests: tests/test_llmcache.py)
+"""
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import warnings
+from contextlib import contextmanager
+from typing import Any, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+
+LLM_CACHE = os.environ.get("LLM_CACHE", "sqlite")
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH",
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "llm.sqlite"))
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", str(7 * 86400)))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "5000"))
+# Eviction runs every N writes, not on each one.
+LLM_CACHE_EVICT_EVERY = int(os.environ.get("LLM_CACHE_EVICT_EVERY", "50"))
+
+# Context variable: LangChain copies the context into its batch threads.
+_refresh = contextvars.ContextVar("llm_cache_refresh", default=False)
+
+
+@contextmanager
+def refreshing(enabled: bool = True):
+    """Within the block the LLM is called again and its answers overwrite the cache."""
+    token = _refresh.set(enabled)
+    try:
+        yield
+    finally:
+        _refresh.reset(token)
+
+
+class SQLiteStore:
+    placeholder = "?"
+
+    def __init__(self, path: str = LLM_CACHE_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.create_table()
+
+    def create_table(self):
+        self.execute("""
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            `key` CHAR(64) PRIMARY KEY,
+            model VARCHAR(255),
+            response TEXT,
+            created_at DOUBLE,
+            last_hit DOUBLE
+        )
+        """)
+        self.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_hit ON llm_cache (last_hit)")
+
+    def execute(self, sql: str, params: tuple = ()) -> list:
+        cursor = self.conn.cursor()
+        cursor.execute(sql.replace("%s", self.placeholder), params)
+        rows = cursor.fetchall()
+        self.conn.commit()
+        return rows
+
+    def upsert_sql(self) -> str:
+        return ("INSERT INTO llm_cache (`key`, model, response, created_at, last_hit) "
+                "VALUES (%s, %s, %s, %s, %s) "
+                "ON CONFLICT(`key`) DO UPDATE SET response = excluded.response, "
+                "created_at = excluded.created_at, last_hit = excluded.last_hit")
+
+    def evict_sql(self) -> str:
+        return ("DELETE FROM llm_cache WHERE `key` IN "
+                "(SELECT `key` FROM llm_cache ORDER BY last_hit LIMIT %s)")
+
+
+class MySQLStore(SQLiteStore):
+    """Same table in the report DB, shared by every app instance."""
+
+    placeholder = "%s"
+
+    def __init__(self):
+        import sink
+        self.conn = sink.connect()
+        self.create_table()
+
+    def create_table(self):
+        self.execute("""
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            `key` CHAR(64) PRIMARY KEY,
+            model VARCHAR(255),
+            response LONGTEXT,
+            created_at DOUBLE,
+            last_hit DOUBLE,
+            INDEX ix_llm_cache_last_hit (last_hit)
+        )
+        """)
+
+    def execute(self, sql: str, params: tuple = ()) -> list:
+        self.conn.ping(reconnect=True, attempts=3, delay=1)
+        cursor = self.conn.cursor()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall() if cursor.with_rows else []
+        self.conn.commit()
+        cursor.close()
+        return rows
+
+    def upsert_sql(self) -> str:
+        return ("INSERT INTO llm_cache (`key`, model, response, created_at, last_hit) "
+                "VALUES (%s, %s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE response = VALUES(response), "
+                "created_at = VALUES(created_at), last_hit = VALUES(last_hit)")
+
+    def evict_sql(self) -> str:
+        return "DELETE FROM llm_cache ORDER BY last_hit LIMIT %s"
+
+
+def _model(llm_string: str) -> str:
+    """Model name from the serialised llm parameters, for inspection only."""
+    try:
+        return str(json.loads(llm_string.split("---")[0]).get("kwargs", {}).get("model_name", ""))[:255]
+    except (ValueError, AttributeError):
+        return ""
+
+
+class LLMResponseCache(BaseCache):
+    def __init__(self, store, ttl: float = LLM_CACHE_TTL,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES,
+                 evict_every: int = LLM_CACHE_EVICT_EVERY):
+        self.store = store
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "writes": 0, "evicted": 0,
+                       "refreshed": 0}
+
+    @staticmethod
+    def key(prompt: str, llm_string: str) -> str:
+        h = hashlib.sha256()
+        h.update(llm_string.encode("utf-8"))
+        h.update(b"\0")
+        h.update(prompt.encode("utf-8"))
+        return h.hexdigest()
+
+    def _count(self, name: str, n: int = 1):
+        self._stats[name] += n
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        if _refresh.get():
+            with self._lock:
+                self._count("refreshed")
+            return None
+        key = self.key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            rows = self.store.execute(
+                "SELECT response, created_at FROM llm_cache WHERE `key` = %s", (key,))
+            if not rows:
+                self._count("misses")
+                return None
+            response, created_at = rows[0]
+            if self.ttl and now - created_at > self.ttl:
+                self.store.execute("DELETE FROM llm_cache WHERE `key` = %s", (key,))
+                self._count("expired")
+                self._count("misses")
+                return None
+            self.store.execute("UPDATE llm_cache SET last_hit = %s WHERE `key` = %s", (now, key))
+            self._count("hits")
+        with warnings.catch_warnings():
+            # langchain_core.load is marked beta; the payload is written by update() only.
+            warnings.simplefilter("ignore")
+            return [loads(g) for g in json.loads(response)]
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        now = time.time()
+        response = json.dumps([dumps(g) for g in return_val])
+        with self._lock:
+            self.store.execute(self.store.upsert_sql(),
+                               (self.key(prompt, llm_string), _model(llm_string), response, now, now))
+            self._count("writes")
+            self._writes += 1
+            if self._writes % self.evict_every == 0:
+                self._evict()
+
+    def _evict(self):
+        if self.ttl:
+            cutoff = time.time() - self.ttl
+            expired = self.store.execute(
+                "SELECT COUNT(*) FROM llm_cache WHERE created_at < %s", (cutoff,))[0][0]
+            if expired:
+                self.store.execute("DELETE FROM llm_cache WHERE created_at < %s", (cutoff,))
+                self._count("expired", expired)
+        total = self.store.execute("SELECT COUNT(*) FROM llm_cache")[0][0]
+        if self.max_entries and total > self.max_entries:
+            self.store.execute(self.store.evict_sql(), (total - self.max_entries,))
+            self._count("evicted", total - self.max_entries)
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self.store.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache | None:
+    """The process-wide cache configured by LLM_CACHE, None when disabled."""
+    global _cache
+    if LLM_CACHE == "off":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            store = MySQLStore() if LLM_CACHE == "mysql" else SQLiteStore()
+            _cache = LLMResponseCache(store)
+        return _cache
+
+
+if __name__ == "__main__":
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import ChatPromptTemplate
+
+    cache = LLMResponseCache(SQLiteStore(":memory:"), ttl=60, max_entries=2, evict_every=1)
+    llm = FakeListChatModel(responses=["print(1)", "print(2)", "print(3)"], cache=cache)
+    chain = ChatPromptTemplate.from_template("Genera codice per {file_text}") | llm | StrOutputParser()
+    for spec in ("spec A", "spec A", "spec B", "spec C"):
+        print(spec, "->", chain.invoke({"file_text": spec}))
+    print(cache.stats())
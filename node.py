@@ -1,62 +1,171 @@
+import hashlib
+import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from langchain import hub
-from langchain.agents import create_react_agent
+from functools import cache
 from langchain_core.tools import tool
-from langchain_openai.chat_models import ChatOpenAI
 from state import AgentState
-from langchain_experimental.tools import PythonREPLTool
-from langchain_core.prompts import HumanMessagePromptTemplate, ChatPromptTemplate
-from langchain_core.tools import tool
+from langchain_core.prompts import HumanMessagePromptTemplate, ChatPromptTemplate, PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_community.callbacks import get_openai_callback
+from codegen import generate_suite, strip_code_fences
+import casegen
+import events
+from sandbox import run_code
+from pool import get_pool
+from repair import failing_line, locate_block, patch, relevant_operations, spec_fragment_text
+from spec import SpecError, parse_spec
+from llmcache import get_llm_cache, refreshing
 
-react_prompt = hub.pull("langchain-ai/react-agent-template")
+# Il prompt ReAct è copiato in prompts/react_agent.prompt (era hub.pull("langchain-ai/react-agent-template")):
+# nessuna chiamata di rete all'import. LLM, agent e template vengono costruiti al primo uso.
+REACT_INSTRUCTIONS = """Sei un agent che è genera codice Python per eseguire un client OpenAPI, partendo da una specifica alla quale i tool possono accedere.
+                Dopo aver generato il codice eseguilo e ritorna l'output dell'applicazione, se ci sono errori correggili e riesegui. """
 
-#react_prompt = hub.pull("hwchase17/react")
+MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1")
+# "single": un unico script dall'intera spec; "tag"/"operation": generazione a blocchi;
+# "schema": casi di test generati dagli schemi senza LLM (LLM solo per le operazioni non gestite).
+GENERATION_MODE = os.getenv("GENERATION_MODE", "single")
+# "subprocess": ogni script in un processo isolato con timeout e limite di memoria;
+# "pool": come subprocess, ma su interpreti già avviati con moduli e connessioni pronti;
+# "repl": esecuzione nel processo corrente con PythonREPLTool.
+EXECUTION_BACKEND = os.getenv("EXECUTION_BACKEND", "subprocess")
+# Budget per run: token consumati dall'LLM e secondi dall'inizio (0 = nessun limite).
+RUN_TOKEN_BUDGET = int(os.getenv("RUN_TOKEN_BUDGET", "200000"))
+RUN_TIME_BUDGET = float(os.getenv("RUN_TIME_BUDGET", "1800"))
 
-with open("prompts/code_generator.prompt", "r", encoding="utf-8") as file:
-    instructions = file.read()
-    
-instructions_template = HumanMessagePromptTemplate.from_template_file("prompts/code_generator.prompt", input_variables=['file_text'])
+
+def _read_prompt(name: str) -> str:
+    with open(f"prompts/{name}", "r", encoding="utf-8") as file:
+        return file.read()
+
+
+@cache
+def get_instructions() -> str:
+    return _read_prompt("code_generator.prompt")
+
+
+@cache
+def get_instructions_template() -> HumanMessagePromptTemplate:
+    return HumanMessagePromptTemplate.from_template(get_instructions())
+
+
+@cache
+def get_repair_instructions() -> str:
+    return _read_prompt("code_repair.prompt")
+
+
+@cache
+def get_llm():
+    from langchain_openai.chat_models import ChatOpenAI
+    # temperature=0: stesse richieste, stesse risposte, servite dalla cache se attiva.
+    return ChatOpenAI(model=MODEL, temperature=0, cache=get_llm_cache())
+
+
+@cache
+def get_react_reasoning_runnable():
+    from langchain.agents import create_react_agent
+    react_prompt = PromptTemplate.from_template(_read_prompt("react_agent.prompt"))
+    prompt = react_prompt.partial(instructions=REACT_INSTRUCTIONS, chat_history="")
+    return create_react_agent(get_llm(), tools, prompt)
 
 
-prompt = react_prompt.partial(instructions = 
-             """Sei un agent che è genera codice Python per eseguire un client OpenAPI, partendo da una specifica alla quale i tool possono accedere.
-                Dopo aver generato il codice eseguilo e ritorna l'output dell'applicazione, se ci sono errori correggili e riesegui. """)
-#prompt = react_prompt
-llm = ChatOpenAI(model="gpt-4.1", temperature=0)
-"""Tool for running python code in a REPL."""
-    
 @tool 
 def generate_python_code(yaml_file: str) -> str:
     """Tool for generating and correct python code."""
-    prompt = ChatPromptTemplate.from_template(template = instructions_template.prompt.template)
-    chain = prompt | llm  | StrOutputParser()
+    try:
+        spec = parse_spec(yaml_file) if GENERATION_MODE != "single" else None
+    except SpecError:
+        # Spec che il parser non gestisce (Swagger 2.0, $ref esterni): prompt unico sul testo.
+        spec = None
+    if spec is not None and GENERATION_MODE == "schema":
+        return casegen.generate_suite(spec, get_llm())
+    if spec is not None and GENERATION_MODE in ("tag", "operation"):
+        return generate_suite(spec, get_llm(), by=GENERATION_MODE)
+    prompt = ChatPromptTemplate.from_template(template = get_instructions_template().prompt.template)
+    chain = prompt | get_llm()  | StrOutputParser()
     result = chain.invoke(input = {"file_text": yaml_file})
     return result
      
 
 
 tools = [ generate_python_code]
-react_reasoning_runnable = create_react_agent(llm, tools, prompt)
 
 
 
+def budget_exceeded(state: AgentState, tokens_used: int) -> str | None:
+    if RUN_TOKEN_BUDGET and tokens_used >= RUN_TOKEN_BUDGET:
+        return f"token budget exhausted ({tokens_used} tokens)"
+    elapsed = time.time() - state.get("started_at", time.time())
+    if RUN_TIME_BUDGET and elapsed >= RUN_TIME_BUDGET:
+        return f"time budget exhausted ({elapsed:.0f}s)"
+    return None
+
+
+def error_signature(output: str) -> str | None:
+    """Last line of a failed execution, e.g. "KeyError: 'id'"."""
+    lines = [line.strip() for line in output.strip().splitlines() if line.strip()]
+    return lines[-1] if lines else "no output"
+
+
 def run_agent_reasoning_engine(state: AgentState):
-    agent_outcome = react_reasoning_runnable.invoke(state)
-    return {"agent_outcome": agent_outcome}
+    with get_openai_callback() as cb:
+        agent_outcome = get_react_reasoning_runnable().invoke(state)
+    tokens_used = state.get("tokens_used", 0) + cb.total_tokens
+    return {"agent_outcome": agent_outcome,
+            "tokens_used": tokens_used,
+            "stop_reason": budget_exceeded(state, tokens_used)}
+
+
+
+def execute_code(code: str, run_id: str | None = None, spec_path: str | None = None) -> str:
+    """Runs generated code and returns its output.
+
+    ``spec_path`` is passed to the code as SPEC_PATH, for the Runner to
+    validate the responses against the spec.
+    """
+    if EXECUTION_BACKEND in ("subprocess", "pool"):
+        code = strip_code_fences(code)
+        run = get_pool().run if EXECUTION_BACKEND == "pool" else run_code
+
+        def on_output(line: str):
+            # Le righe evento (richieste registrate) vanno agli stream SSE, non al log.
+            if not events.relay_line(run_id, line):
+                print(f"[{run_id}] {line}")
 
+        result = run(code, run_id, spec_path=spec_path, on_output=on_output)
+        return events.strip_event_lines(result.output)
+    # Namespace nuovo per ogni run: run concorrenti non condividono variabili
+    # e il codice generato riceve l'id della run_sequence da usare.
+    from langchain_experimental.tools import PythonREPLTool
+    from langchain_experimental.utilities import PythonREPL
+    repl = PythonREPL(_globals={"RUN_SEQUENCE_ID": run_id, "SPEC_PATH": spec_path}, _locals=None)
+    return str(PythonREPLTool(python_repl=repl).invoke(code))
+
+
+def looks_successful(output: str) -> bool:
+    """The generated code ends by printing the number of recorded requests."""
+    lines = [line.strip() for line in output.strip().splitlines() if line.strip()]
+    return bool(lines) and lines[-1].isdigit()
 
 
 def run_pythonREPLTool(state: AgentState) :
     print("Running Python REPL Tool")
     agent_action = state["agent_outcome"]
     code = state["intermediate_steps"][-1][1]
-    output = PythonREPLTool().invoke(code)
-    
-    return {"intermediate_steps": [(agent_action, str(output))]}
+    output = execute_code(code, state.get("run_id"), state.get("spec_path"))
+
+    error = None if looks_successful(output) else error_signature(output)
+    stop_reason = budget_exceeded(state, state.get("tokens_used", 0))
+    if error is not None and error == state.get("last_error"):
+        stop_reason = f"same error twice: {error}"
+
+    return {"intermediate_steps": [(agent_action, output)],
+            "last_error": error,
+            "stop_reason": stop_reason}
 
 
 def execute_tools(state: AgentState):
@@ -73,16 +182,73 @@ def execute_tools(state: AgentState):
             selected_tool = tool
             break
     
-    if selected_tool:
-        # Esegui il tool selezionato con l'input fornito
-        if selected_tool.name == "generate_python_code":
-            output = selected_tool.invoke(state['file_text'])
+    # Dopo un'esecuzione fallita (o con force) la risposta in cache è il codice
+    # che non funziona: l'LLM viene richiamato e la cache aggiornata.
+    refresh = bool(state.get("force") or state.get("last_error"))
+    with get_openai_callback() as cb, refreshing(refresh):
+        if selected_tool:
+            # Esegui il tool selezionato con l'input fornito
+            if selected_tool.name == "generate_python_code":
+                output = selected_tool.invoke(state['file_text'])
+            else:
+                 output = selected_tool.invoke(tool_input)
         else:
-             output = selected_tool.invoke(tool_input)
-    else:
-        output = f"Error: Tool '{tool_name}' not found"
-    
-    return {"intermediate_steps": [(agent_action, str(output))]}
+            output = f"Error: Tool '{tool_name}' not found"
+    output = str(output)
+
+    tokens_used = state.get("tokens_used", 0) + cb.total_tokens
+    stop_reason = budget_exceeded(state, tokens_used)
+    code_hash = hashlib.sha256(output.encode("utf-8")).hexdigest()
+    if code_hash == state.get("last_code_hash"):
+        stop_reason = "regenerated code identical to the previous attempt"
+
+    return {"intermediate_steps": [(agent_action, output)],
+            "iteration": state.get("iteration", 0) + 1,
+            "tokens_used": tokens_used,
+            "last_code_hash": code_hash,
+            "stop_reason": stop_reason,
+            "repaired": False}
+
+
+def run_repair(state: AgentState):
+    """Asks the LLM to fix only the block of code that raised.
+
+    Returns the patched code as a new step for the executor; when the block
+    or the operations it calls cannot be located no step is added and the
+    agent regenerates the code as before.
+    """
+    agent_action = state["agent_outcome"]
+    code = strip_code_fences(state["intermediate_steps"][-2][1])
+    output = state["intermediate_steps"][-1][1]
+
+    try:
+        spec = parse_spec(state["file_text"])
+    except SpecError:
+        print("Repair: spec not parseable, falling back to regeneration")
+        return {"repaired": False}
+    line = failing_line(output)
+    block = locate_block(code, line) if line else None
+    operations = relevant_operations(spec, block) if block else []
+    if not operations:
+        print("Repair: failing block not found, falling back to regeneration")
+        return {"repaired": False}
+
+    chain = ChatPromptTemplate.from_template(get_repair_instructions()) | get_llm() | StrOutputParser()
+    with get_openai_callback() as cb, refreshing(bool(state.get("force"))):
+        fixed = chain.invoke({"error": output[-4000:],
+                              "block": block.code,
+                              "spec_fragment": spec_fragment_text(spec, operations)})
+    patched = patch(code, block, fixed)
+    print(f"Repair: patched lines {block.start}-{block.end} "
+          f"({len(operations)} operations, {cb.total_tokens} tokens)")
+
+    tokens_used = state.get("tokens_used", 0) + cb.total_tokens
+    return {"intermediate_steps": [(agent_action, patched)],
+            "iteration": state.get("iteration", 0) + 1,
+            "tokens_used": tokens_used,
+            "last_code_hash": hashlib.sha256(patched.encode("utf-8")).hexdigest(),
+            "stop_reason": budget_exceeded(state, tokens_used),
+            "repaired": True}
 
 
 if __name__ == "__main__":
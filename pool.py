@@ -0,0 +1,245 @@
+"""Pool of pre-warmed interpreters for generated code.
+
+Each worker is a long-lived Python process that has already imported
+``requests``, ``mysql.connector``, ``auth``, ``runner`` and ``sink``,
+opened the report DB connection and keeps its HTTP sessions (and their
+keep-alive connections) across scripts, so a generated script only pays
+for its own work. Scripts run in a fresh namespace; their output is streamed back
+line by line. A worker that exceeds the timeout is killed and replaced, and
+workers are recycled after ``POOL_MAX_JOBS`` scripts to bound leaks.
+
+Protocol: one JSON object per line on the worker's stdin/stdout. The worker
+moves its own fd 1 onto stderr so stray writes cannot corrupt the channel.
+"""
+import io
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable
+
+import events
+from sandbox import PROJECT_DIR, SANDBOX_MEMORY_MB, SANDBOX_TIMEOUT, SandboxResult
+
+POOL_SIZE = int(os.environ.get("POOL_SIZE", "2"))
+POOL_MAX_JOBS = int(os.environ.get("POOL_MAX_JOBS", "50"))
+
+
+class _Worker:
+    def __init__(self, memory_mb: int):
+        env = {**os.environ, "PYTHONUNBUFFERED": "1", events.RELAY_ENV: "1"}
+        self.proc = subprocess.Popen(
+            [sys.executable, os.path.join(PROJECT_DIR, "pool.py"), str(memory_mb)],
+            cwd=PROJECT_DIR,
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            start_new_session=True,
+        )
+        self.jobs = 0
+        self.messages: queue.Queue = queue.Queue()
+        threading.Thread(target=self._read, name="pool-reader", daemon=True).start()
+
+    def _read(self):
+        for line in self.proc.stdout:
+            try:
+                self.messages.put(json.loads(line))
+            except ValueError:
+                continue
+        self.messages.put(None)
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def kill(self):
+        try:
+            os.killpg(self.proc.pid, 9)
+        except (ProcessLookupError, PermissionError, AttributeError):
+            self.proc.kill()
+        self.proc.wait()
+
+    def run(self, code: str, run_id: str | None, timeout: float,
+            on_output: Callable[[str], None] | None,
+            spec_path: str | None = None) -> SandboxResult:
+        self.jobs += 1
+        start = time.monotonic()
+        deadline = start + timeout
+        self.proc.stdin.write(json.dumps({"code": code, "run_id": run_id, "spec_path": spec_path}) + "\n")
+        self.proc.stdin.flush()
+
+        lines = []
+        while True:
+            try:
+                msg = self.messages.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                self.kill()
+                lines.append(f"\nTimeoutError: execution killed after {timeout:.0f}s\n")
+                return SandboxResult("".join(lines), None, True, time.monotonic() - start)
+            if msg is None:
+                self.proc.wait()
+                lines.append(f"\nWorker exited with code {self.proc.returncode}\n")
+                return SandboxResult("".join(lines), self.proc.returncode, False,
+                                     time.monotonic() - start)
+            if "out" in msg:
+                lines.append(msg["out"])
+                if on_output:
+                    on_output(msg["out"].rstrip("\n"))
+            elif "done" in msg:
+                return SandboxResult("".join(lines), 0 if msg["ok"] else 1, False,
+                                     time.monotonic() - start)
+
+
+class InterpreterPool:
+    def __init__(self, size: int = POOL_SIZE, timeout: float = SANDBOX_TIMEOUT,
+                 memory_mb: int = SANDBOX_MEMORY_MB, max_jobs: int = POOL_MAX_JOBS):
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.max_jobs = max_jobs
+        self._idle: queue.Queue = queue.Queue()
+        for _ in range(size):
+            self._idle.put(_Worker(memory_mb))
+
+    def run(self, code: str, run_id: str | None = None,
+            on_output: Callable[[str], None] | None = None,
+            timeout: float | None = None,
+            spec_path: str | None = None) -> SandboxResult:
+        """Runs ``code`` on an idle worker, waiting for one if all are busy."""
+        worker = self._idle.get()
+        if not worker.alive():
+            worker = _Worker(self.memory_mb)
+        try:
+            return worker.run(code, run_id, timeout or self.timeout, on_output, spec_path)
+        finally:
+            if not worker.alive() or worker.jobs >= self.max_jobs:
+                if worker.alive():
+                    worker.kill()
+                worker = _Worker(self.memory_mb)
+            self._idle.put(worker)
+
+    def close(self):
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            if worker.alive():
+                worker.kill()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> InterpreterPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = InterpreterPool()
+        return _pool
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+#  Worker side
+# ──────────────────────────────────────────────────────────────────────────────
+class _LineWriter(io.TextIOBase):
+    """stdout replacement that forwards complete lines to the parent."""
+
+    def __init__(self, send):
+        self._send = send
+        self._buffer = ""
+        self._lock = threading.Lock()
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        with self._lock:
+            self._buffer += s
+            *complete, self._buffer = self._buffer.split("\n")
+            for line in complete:
+                self._send({"out": line + "\n"})
+        return len(s)
+
+    def flush(self):
+        with self._lock:
+            if self._buffer:
+                self._send({"out": self._buffer})
+                self._buffer = ""
+
+
+def _warm_up():
+    import requests  # noqa: F401
+    import mysql.connector  # noqa: F401
+    import auth  # noqa: F401
+    import runner
+    import validator  # noqa: F401
+    import sink
+
+    runner.shared_sessions = {}
+    try:
+        conn = sink.connect()
+        sink.ensure_tables(conn)
+        sink.shared_connection = conn
+    except Exception as e:
+        print(f"Worker DB warm-up failed: {e}", file=sys.stderr)
+
+
+def _serve(memory_mb: int):
+    import linecache
+    import traceback
+
+    try:
+        import resource
+        if memory_mb > 0:
+            limit = memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except ImportError:
+        pass
+
+    channel = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    os.dup2(2, 1)
+    send_lock = threading.Lock()
+
+    def send(msg):
+        with send_lock:
+            channel.write(json.dumps(msg) + "\n")
+            channel.flush()
+
+    _warm_up()
+    import sink
+
+    writer = _LineWriter(send)
+    for line in sys.stdin:
+        job = json.loads(line)
+        filename = f"<generated {job['run_id'] or ''}>"
+        code = job["code"]
+        # Registered so that tracebacks show the source lines.
+        linecache.cache[filename] = (len(code), None, code.splitlines(True), filename)
+        namespace = {"__name__": "__main__", "RUN_SEQUENCE_ID": job["run_id"],
+                     "SPEC_PATH": job.get("spec_path")}
+
+        sys.stdout = sys.stderr = writer
+        ok = True
+        try:
+            exec(compile(code, filename, "exec"), namespace)
+        except SystemExit as e:
+            ok = e.code in (None, 0)
+        except BaseException:
+            ok = False
+            traceback.print_exc()
+        finally:
+            # Sinks the script forgot to close are flushed before the next job.
+            sink._flush_open_sinks()
+            writer.flush()
+            sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+            linecache.cache.pop(filename, None)
+        send({"done": True, "ok": ok})
+
+
+if __name__ == "__main__":
+    _serve(int(sys.argv[1]) if len(sys.argv) > 1 else SANDBOX_MEMORY_MB)
@@ -0,0 +1,67 @@
+"""Targeted repair of generated code.
+
+From the traceback of a failed execution, finds the top-level block of the
+script that raised (a stitched chunk function, a loop over one API, ...),
+the operations of the spec that block calls, and splices the LLM's fixed
+version of just that block back into the script.
+"""
+import ast
+import re
+import textwrap
+from dataclasses import dataclass
+
+import yaml
+
+from codegen import strip_code_fences
+from spec import Spec
+
+# Frames of the generated script: subprocess sandbox, interpreter pool, in-process REPL.
+_FRAME = re.compile(r'File "(?:[^"]*generated_[^"]*\.py|<generated[^"]*>|<string>)", line (\d+)')
+
+
+@dataclass
+class Block:
+    start: int  # first line, 1-based
+    end: int  # last line, inclusive
+    indent: int
+    code: str
+
+
+def failing_line(output: str) -> int | None:
+    """Innermost line of the generated script in the traceback."""
+    lines = _FRAME.findall(output)
+    return int(lines[-1]) if lines else None
+
+
+def locate_block(code: str, line: int) -> Block | None:
+    """Top-level statement of ``code`` containing ``line``."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    for node in tree.body:
+        start = node.lineno
+        if getattr(node, "decorator_list", None):
+            start = min(d.lineno for d in node.decorator_list)
+        if start <= line <= node.end_lineno:
+            lines = code.splitlines()
+            return Block(start=start, end=node.end_lineno, indent=node.col_offset,
+                         code="\n".join(lines[start - 1:node.end_lineno]))
+    return None
+
+
+def relevant_operations(spec: Spec, block: Block) -> list:
+    """Operations whose path (as written in the spec) appears in the block."""
+    return [op for op in spec.operations
+            if f'"{op.path}"' in block.code or f"'{op.path}'" in block.code]
+
+
+def spec_fragment_text(spec: Spec, operations: list) -> str:
+    return yaml.safe_dump(spec.fragment(operations), sort_keys=False, allow_unicode=True)
+
+
+def patch(code: str, block: Block, fixed: str) -> str:
+    """Replaces ``block`` in ``code`` with ``fixed``, keeping its indentation."""
+    fixed = textwrap.indent(textwrap.dedent(strip_code_fences(fixed)), " " * block.indent)
+    lines = code.splitlines()
+    return "\n".join(lines[:block.start - 1] + fixed.splitlines() + lines[block.end:]) + "\n"
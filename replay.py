@@ -0,0 +1,151 @@
+"""Re-executes the recorded requests of a run, without the LLM.
+
+The calls of a past run_sequence are rebuilt from its request rows (URL,
+method, body, headers and expected status codes from the ``replay`` column
+written by the Runner) and sent again concurrently by a new Runner,
+optionally against another base URL. The results are recorded as a new run,
+to be compared with the original one on /compare.
+
+Rows recorded before the ``replay`` column are replayed on a best-effort
+basis:
+
+- expected codes: a call that was OK expects the same status code, a failed
+  one any 2xx;
+- body: the recorded payload of a POST/PUT/PATCH is sent as JSON when it is
+  an object or a list (query parameters are already in the recorded URL);
+  form and raw bodies are not recognised;
+- order: the dependencies between calls are unknown, so the calls run one
+  after the other in recording order (date, then id: calls recorded in the
+  same second may swap).
+
+In every case ``check`` functions and multipart files are not replayed.
+
+    python replay.py <run_id> [base_url]
+"""
+import base64
+import json
+import sys
+import uuid
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit, urlunsplit
+
+import bodystore
+import sink
+from runner import Runner
+from sink import ResultSink
+
+SUCCESS_CODES = tuple(range(200, 300))
+BODY_METHODS = ("POST", "PUT", "PATCH")
+
+
+@dataclass
+class RecordedCall:
+    api: str
+    method: str
+    url: str
+    variant: str | None
+    expect: tuple
+    body: str | None = None
+    payload: object = None
+    headers: dict | None = None
+    auth: bool = True
+    index: int = 0
+    after: list = field(default_factory=list)
+    base_url: str = ""
+
+
+def _json(value):
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode("utf-8")
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def load_calls(conn, run_id: str) -> list[RecordedCall]:
+    """The calls of a run in registration order (recording order for old rows)."""
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT r.api, r.api_path, r.method, r.variant, r.http_code, r.outcome, "
+        "r.request, r.replay, b.codec, b.data "
+        "FROM request r LEFT JOIN request_body b ON b.hash = r.request_ref "
+        "WHERE r.run_sequence = %s ORDER BY r.date, r.id", (run_id,))
+    rows = cursor.fetchall()
+    cursor.close()
+
+    calls = []
+    previous_legacy = None
+    for position, (api, url, method, variant, http_code, outcome,
+                   request, replay, codec, data) in enumerate(rows):
+        info = _json(replay) or {}
+        if "payload_base64" in info:
+            payload = base64.b64decode(info["payload_base64"])
+        elif "payload" in info:
+            payload = info["payload"]
+        else:
+            payload = bodystore.load(codec, data) if data is not None else _json(request)
+
+        if "index" in info:
+            call = RecordedCall(
+                api=api, method=method, url=url, variant=variant,
+                expect=tuple(info["expect"]), body=info.get("body"), payload=payload,
+                headers=info.get("headers"), auth=info.get("auth", True),
+                index=info["index"], after=info.get("after", []),
+                base_url=info.get("base_url") or "")
+        else:
+            # Row recorded before the replay column: see the module docstring.
+            body = "json" if method in BODY_METHODS and isinstance(payload, (dict, list)) else None
+            call = RecordedCall(
+                api=api, method=method, url=url, variant=variant,
+                expect=(http_code,) if outcome == "OK" else SUCCESS_CODES,
+                body=body, payload=payload, index=position,
+                after=[previous_legacy] if previous_legacy is not None else [])
+            previous_legacy = position
+        calls.append(call)
+    calls.sort(key=lambda c: c.index)
+    return calls
+
+
+def rebase(url: str, old_base: str, new_base: str | None) -> str:
+    """``url`` moved from the recorded base URL to ``new_base``."""
+    if not new_base:
+        return url
+    if old_base and url.startswith(old_base.rstrip("/")):
+        return new_base.rstrip("/") + url[len(old_base.rstrip("/")):]
+    # Base URL not recorded: only scheme and host change.
+    new = urlsplit(new_base)
+    return urlunsplit(urlsplit(url)._replace(scheme=new.scheme, netloc=new.netloc))
+
+
+def replay(run_id: str, base_url: str | None = None, new_run_id: str | None = None,
+           spec_path: str | None = None) -> tuple[str, int]:
+    """Replays run ``run_id`` as ``new_run_id``; returns the new id and the rows recorded."""
+    conn = sink.connect()
+    try:
+        calls = load_calls(conn, run_id)
+    finally:
+        conn.close()
+    if not calls:
+        raise ValueError(f"Run {run_id} has no recorded requests")
+
+    new_run_id = new_run_id or str(uuid.uuid4())
+    result_sink = ResultSink(new_run_id)
+    result_sink.start_run()
+    runner = Runner(base_url or calls[0].base_url, on_result=result_sink.add, spec=spec_path)
+    registered = {}
+    for call in calls:
+        body = {call.body: call.payload} if call.body in ("json", "data") else {}
+        registered[call.index] = runner.add(
+            call.api, call.method, path=rebase(call.url, call.base_url, base_url),
+            headers=call.headers, auth=call.auth, expect=call.expect, variant=call.variant,
+            after=[registered[i] for i in call.after if i in registered], **body)
+    try:
+        runner.run()
+    finally:
+        result_sink.close()
+    return new_run_id, result_sink.count
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("usage: python replay.py <run_id> [base_url]")
+    new_id, count = replay(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"Run {new_id}: {count} requests")
@@ -0,0 +1,340 @@
+"""Concurrent execution runtime for generated API test calls.
+
+Generated clients register every call with ``Runner.add`` and then call
+``Runner.run``: independent calls run in parallel on a bounded pool, while
+calls sharing a ``group`` (e.g. create -> read -> delete of the same
+resource) or listed in ``after`` keep their order. With a ``spec`` every
+response is validated against it and the violations are recorded in the row.
+
+Each row also carries the timing of the call: total latency and time to
+first byte in milliseconds, request/response body sizes and the number of
+retries (connection errors and 502/503/504 on idempotent methods).
+
+Rows carry a ``variant`` naming the call among those of the same api and
+method (``example``, ``invalid``...; ``#1``, ``#2``... in registration order
+when not given), so that two runs of the same suite can be compared, and
+a ``replay`` dict with what replay.py needs to send the call again.
+
+    runner = Runner(BASE_URL, on_result=lambda row: insert_request(run_sequence=run_id, **row))
+    created = runner.add("/pet", "POST", json=pet, expect=(200,), group="pet-10")
+    runner.add("/pet/{petId}", "GET", path="/pet/10", expect=(200,), group="pet-10")
+    runner.run()
+"""
+import base64
+import datetime
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from auth import get_oauth2_bearer_token
+from validator import get_validator
+
+RUNNER_CONCURRENCY = int(os.environ.get("RUNNER_CONCURRENCY", "8"))
+RUNNER_TIMEOUT = float(os.environ.get("RUNNER_TIMEOUT", "30"))
+RUNNER_RETRIES = int(os.environ.get("RUNNER_RETRIES", "2"))
+
+# Sessions reused by every Runner of the process when set (pre-warmed workers):
+# keep-alive connections to an API survive from one run to the next.
+shared_sessions: dict | None = None
+_shared_lock = threading.Lock()
+
+
+@dataclass
+class Call:
+    api: str
+    method: str
+    path: str
+    params: Any = None
+    json: Any = None
+    data: Any = None
+    files: Any = None
+    headers: dict | None = None
+    auth: bool = True
+    expect: tuple = (200,)
+    check: Callable | None = None
+    request: Any = None
+    variant: str | None = None
+    deps: list = field(default_factory=list)
+    index: int = 0
+    result: dict | None = None
+
+
+def now():
+    return datetime.datetime.now().replace(microsecond=0)
+
+
+# Credentials are not recorded: replay gets a fresh token through auth=True.
+SENSITIVE_HEADERS = {"authorization", "cookie", "proxy-authorization"}
+
+
+def recorded_headers(headers: dict | None) -> dict | None:
+    """The call headers without credentials, as stored in the replay info."""
+    if not headers:
+        return headers
+    return {k: v for k, v in headers.items() if k.lower() not in SENSITIVE_HEADERS}
+
+
+def recorded_payload(call: Call):
+    """What the report records as request payload: ``request``, else json/data/params."""
+    if call.request is not None:
+        return call.request
+    return next((p for p in (call.json, call.data, call.params) if p is not None), None)
+
+
+class Runner:
+    def __init__(self, base_url: str = "", max_concurrency: int = RUNNER_CONCURRENCY,
+                 on_result: Callable[[dict], None] | None = None,
+                 timeout: float = RUNNER_TIMEOUT,
+                 spec: str | None = None,
+                 retries: int = RUNNER_RETRIES):
+        self.base_url = base_url.rstrip("/")
+        self.validator = get_validator(spec) if spec else None
+        self.max_concurrency = max_concurrency
+        self.on_result = on_result
+        self.timeout = timeout
+        self.retries = retries
+        self.calls: list[Call] = []
+        self._groups: dict[str, Call] = {}
+        self._variants: dict[tuple, int] = {}
+        self._owns_sessions = shared_sessions is None
+        self._sessions: dict = {} if self._owns_sessions else shared_sessions
+        self._sessions_lock = threading.Lock() if self._owns_sessions else _shared_lock
+
+    def add(self, api: str, method: str, path: str | None = None, *,
+            params=None, json=None, data=None, files=None, headers=None,
+            auth: bool = True, expect=(200,), check=None, request=None,
+            group: str | None = None, after: list[Call] | None = None,
+            variant: str | None = None) -> Call:
+        """Registers a call.
+
+        ``api`` is the path template recorded in the report (``/pet/{petId}``),
+        ``path`` the concrete path or full URL to call (defaults to ``api``).
+        The outcome is OK when the status code is in ``expect`` and the
+        optional ``check(response)`` returns True. ``request`` overrides what
+        is recorded as request payload (defaults to json/data/params).
+        ``variant`` names the case among the calls of the same api and method.
+        """
+        key = (api, method.upper(), variant)
+        n = self._variants[key] = self._variants.get(key, 0) + 1
+        if variant is None:
+            variant = f"#{n}"
+        elif n > 1:
+            variant = f"{variant}#{n}"
+        call = Call(api=api, method=method.upper(), path=path or api,
+                    params=params, json=json, data=data, files=files,
+                    headers=headers, auth=auth, expect=tuple(expect), check=check,
+                    request=request, variant=variant, index=len(self.calls))
+        if after:
+            call.deps.extend(after)
+        if group is not None:
+            if group in self._groups:
+                call.deps.append(self._groups[group])
+            self._groups[group] = call
+        self.calls.append(call)
+        return call
+
+    def run(self) -> list[dict]:
+        """Executes all registered calls and returns their results in order.
+
+        ``on_result`` is invoked from the calling thread, so it may safely use
+        a connection that is not thread-safe.
+        """
+        pending = {id(c): c for c in self.calls}
+        done: set[int] = set()
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                thread_name_prefix="runner") as pool:
+            while pending or running:
+                for key, call in list(pending.items()):
+                    if all(id(dep) in done for dep in call.deps):
+                        del pending[key]
+                        running[pool.submit(self._execute, call)] = call
+                if not running:
+                    raise RuntimeError("Dependency cycle between registered calls")
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    call = running.pop(future)
+                    call.result = future.result()
+                    done.add(id(call))
+                    if self.on_result:
+                        self.on_result(call.result)
+
+        for session in self._sessions.values():
+            if self._owns_sessions:
+                session.close()
+            else:
+                # Shared session: the next run must not inherit this one's cookies.
+                session.cookies.clear()
+        return [c.result for c in self.calls]
+
+    def _session(self, url: str) -> requests.Session:
+        # Retries and pool size are part of the key: shared sessions serve
+        # Runners configured differently.
+        key = (urlsplit(url).netloc, self.retries, self.max_concurrency)
+        with self._sessions_lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                retry = Retry(total=self.retries, status_forcelist=(502, 503, 504),
+                              backoff_factor=0.2, raise_on_status=False)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency,
+                                      max_retries=retry)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[key] = session
+            return session
+
+    def _url(self, path: str) -> str:
+        if path.startswith(("http://", "https://")):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _replay_info(self, call: Call) -> dict:
+        """How the call was sent, beyond the URL and the recorded request payload."""
+        body = "json" if call.json is not None else "data" if call.data is not None else None
+        info = {
+            "index": call.index,
+            "base_url": self.base_url,
+            "body": body,
+            "files": call.files is not None,
+            "headers": recorded_headers(call.headers),
+            # A bearer token passed by hand is replaced by a fresh one on replay.
+            "auth": call.auth or any(k.lower() == "authorization" for k in call.headers or {}),
+            "expect": list(call.expect),
+            "after": [dep.index for dep in call.deps],
+        }
+        sent = call.json if body == "json" else call.data
+        if isinstance(sent, (bytes, bytearray)):
+            # Raw bytes are recorded as {"base64": ...}: keep the exact body.
+            info["payload_base64"] = base64.b64encode(sent).decode("ascii")
+        elif call.request is not None and body is not None:
+            # The recorded payload was overridden: keep the body actually sent.
+            info["payload"] = sent
+        return info
+
+    def _execute(self, call: Call) -> dict:
+        """The result row of the call; never raises, a failure is a FAILED row."""
+        row = {
+            "id": str(uuid.uuid4()),
+            "date": now(),
+            "api": call.api,
+            # Full URL with the query string: rows of failed calls keep it too.
+            "api_path": _prepared_url(self._url(call.path), call.params),
+            "method": call.method,
+            "variant": call.variant,
+            "request": recorded_payload(call),
+            "replay": self._replay_info(call),
+        }
+        start = time.perf_counter()
+        try:
+            return self._send(call, row)
+        except Exception as e:
+            # Token fetch or an unexpected error: the call fails alone
+            # instead of aborting run() and every call still pending.
+            row.update(http_code=row.get("http_code", 0), outcome="FAILED",
+                       response={"error": f"{type(e).__name__}: {e}"},
+                       latency_ms=row.get("latency_ms", _ms(time.perf_counter() - start)))
+            return row
+
+    def _send(self, call: Call, row: dict) -> dict:
+        url = self._url(call.path)
+        headers = {}
+        if call.auth:
+            headers["Authorization"] = f"Bearer {get_oauth2_bearer_token()}"
+        if call.headers:
+            headers.update(call.headers)
+
+        start = time.perf_counter()
+        try:
+            # stream=True: request() returns once the headers are read (TTFB),
+            # the body is downloaded by resp.content.
+            resp = self._session(url).request(
+                call.method, url, params=call.params, json=call.json, data=call.data,
+                files=call.files, headers=headers, timeout=self.timeout, stream=True)
+            ttfb = time.perf_counter() - start
+            content = resp.content
+        except requests.RequestException as e:
+            row.update(http_code=0, outcome="FAILED",
+                       response={"error": f"{type(e).__name__}: {e}"},
+                       latency_ms=_ms(time.perf_counter() - start),
+                       # Connection errors surface only once every retry has failed.
+                       retries=self.retries if isinstance(e, requests.ConnectionError) else 0)
+            return row
+        latency = time.perf_counter() - start
+
+        ok = resp.status_code in call.expect
+        if ok and call.check is not None:
+            try:
+                ok = bool(call.check(resp))
+            except Exception:
+                ok = False
+        body = _body(resp)
+        row.update(api_path=resp.url,
+                   http_code=resp.status_code,
+                   outcome="OK" if ok else "FAILED",
+                   response=body,
+                   latency_ms=_ms(latency),
+                   ttfb_ms=_ms(ttfb),
+                   request_bytes=_size(resp.request.body),
+                   response_bytes=len(content or b""),
+                   retries=_retries(resp))
+        if self.validator is not None:
+            try:
+                row["violations"] = self.validator.validate(
+                    call.api, call.method, resp.status_code, resp.headers.get("Content-Type"), body)
+            except Exception as e:
+                # The response is kept: only the validation could not be done.
+                row["violations"] = [{"kind": "validator", "path": "",
+                                      "message": f"{type(e).__name__}: {e}"}]
+        return row
+
+
+def _prepared_url(url: str, params) -> str:
+    """``url`` with ``params`` encoded as requests sends it."""
+    if not params:
+        return url
+    prepared = requests.models.PreparedRequest()
+    try:
+        prepared.prepare_url(url, params)
+    except requests.RequestException:
+        return url
+    return prepared.url
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+
+def _size(body) -> int:
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode("utf-8"))
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    return 0  # streamed body (file objects): size unknown
+
+
+def _retries(resp) -> int:
+    retries = getattr(getattr(resp, "raw", None), "retries", None)
+    return len(retries.history) if retries is not None else 0
+
+
+def _body(resp: requests.Response):
+    if not resp.content:
+        return None
+    try:
+        return resp.json()
+    except ValueError:
+        return resp.text
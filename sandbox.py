@@ -0,0 +1,120 @@
+"""Isolated execution of generated code.
+
+Each script runs in its own Python subprocess (own session, so the whole
+process group can be killed) with a wall-clock timeout and an address-space
+limit. stdout and stderr are merged and streamed line by line to an optional
+callback while the process runs.
+"""
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+import events
+
+SANDBOX_TIMEOUT = float(os.environ.get("SANDBOX_TIMEOUT", "600"))
+SANDBOX_MEMORY_MB = int(os.environ.get("SANDBOX_MEMORY_MB", "1024"))
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Limits are applied by the child itself (preexec_fn is unsafe in a threaded
+# server). RUN_SEQUENCE_ID and SPEC_PATH are injected as globals, as with the
+# in-process REPL, and the script keeps its own file name so traceback line
+# numbers match.
+_BOOTSTRAP = """\
+import runpy, sys
+try:
+    import resource
+    limit = int(sys.argv[3]) * 1024 * 1024
+    if limit > 0:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+except ImportError:
+    pass
+runpy.run_path(sys.argv[1], init_globals={"RUN_SEQUENCE_ID": sys.argv[2] or None,
+                                          "SPEC_PATH": sys.argv[4] or None},
+               run_name="__main__")
+"""
+
+
+@dataclass
+class SandboxResult:
+    output: str
+    returncode: int | None
+    timed_out: bool
+    duration: float
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+
+def _kill(proc: subprocess.Popen):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError, AttributeError):
+        proc.kill()
+
+
+def run_code(code: str, run_id: str | None = None,
+             timeout: float = SANDBOX_TIMEOUT,
+             memory_mb: int = SANDBOX_MEMORY_MB,
+             on_output: Callable[[str], None] | None = None,
+             spec_path: str | None = None) -> SandboxResult:
+    """Runs ``code`` in a subprocess and returns its combined output."""
+    fd, script = tempfile.mkstemp(prefix="generated_", suffix=".py")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(code)
+
+    env = {**os.environ, "PYTHONUNBUFFERED": "1", events.RELAY_ENV: "1"}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [PROJECT_DIR, env.get("PYTHONPATH")]))
+
+    lines: list[str] = []
+    start = time.monotonic()
+    try:
+        proc = subprocess.Popen(
+            [sys.executable, "-c", _BOOTSTRAP, script, run_id or "", str(memory_mb), spec_path or ""],
+            cwd=PROJECT_DIR,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            start_new_session=True,
+        )
+
+        def pump():
+            for line in proc.stdout:
+                lines.append(line)
+                if on_output:
+                    on_output(line.rstrip("\n"))
+
+        reader = threading.Thread(target=pump, name="sandbox-output", daemon=True)
+        reader.start()
+
+        timed_out = False
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            _kill(proc)
+            proc.wait()
+        reader.join(5)
+    finally:
+        os.remove(script)
+
+    output = "".join(lines)
+    if timed_out:
+        output += f"\nTimeoutError: execution killed after {timeout:.0f}s\n"
+    elif proc.returncode and proc.returncode < 0:
+        output += f"\nProcess killed by signal {-proc.returncode}\n"
+    return SandboxResult(output=output,
+                         returncode=proc.returncode,
+                         timed_out=timed_out,
+                         duration=time.monotonic() - start)
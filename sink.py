@@ -0,0 +1,294 @@
+"""Buffered writer for the run_sequence/request report tables.
+
+Rows are collected in memory and written with ``executemany`` in batches of
+``SINK_BATCH_SIZE`` or every ``SINK_FLUSH_INTERVAL`` seconds, one transaction
+per flush. Every open sink is flushed again at process exit. Each added row
+is also published as a live "request" event of the run (see events.py).
+
+    sink = ResultSink(run_id)
+    sink.start_run()
+    runner = Runner(BASE_URL, on_result=sink.add)
+    runner.run()
+    sink.close()
+    print(sink.count)
+"""
+import atexit
+import base64
+import datetime
+import json
+import os
+import threading
+import weakref
+
+import mysql.connector
+
+import bodystore
+import events
+
+SINK_BATCH_SIZE = int(os.environ.get("SINK_BATCH_SIZE", "200"))
+SINK_FLUSH_INTERVAL = float(os.environ.get("SINK_FLUSH_INTERVAL", "2"))
+
+REQUEST_COLUMNS = ("id", "date", "api", "api_path", "method", "variant", "http_code",
+                   "outcome", "request", "response", "violations",
+                   "latency_ms", "ttfb_ms", "request_bytes", "response_bytes", "retries",
+                   "request_ref", "response_ref", "replay", "run_sequence")
+JSON_COLUMNS = ("request", "response", "violations", "replay")
+# Columns added after the first release: created on tables that predate them.
+REQUEST_MIGRATIONS = {
+    "violations": "JSON",
+    "latency_ms": "DOUBLE",
+    "ttfb_ms": "DOUBLE",
+    "request_bytes": "INT",
+    "response_bytes": "INT",
+    "retries": "INT",
+    "request_ref": "CHAR(64)",
+    "response_ref": "CHAR(64)",
+    "variant": "VARCHAR(128)",
+    "replay": "JSON",
+}
+
+# Fields of a row published as a live "request" event (bodies stay in the DB).
+EVENT_COLUMNS = ("id", "api", "method", "http_code", "outcome", "latency_ms", "retries")
+
+_tables_ready = False
+_tables_lock = threading.Lock()
+_open_sinks = weakref.WeakSet()
+
+# Connection reused by every sink of the process when set (pre-warmed workers).
+shared_connection = None
+_shared_lock = threading.Lock()
+
+
+def connect():
+    """Opens a connection to the report DB from the MYSQL_* env variables."""
+    host, port = os.environ["MYSQL_HOST"].split(":")
+    return mysql.connector.connect(
+        host=host,
+        port=int(port),
+        user=os.environ["MYSQL_USER"],
+        password=os.environ["MYSQL_PASSWORD"],
+        database=os.environ["MYSQL_SCHEMA"],
+        autocommit=False,
+    )
+
+
+def _shared():
+    """The shared connection, reconnected if the server dropped it."""
+    if shared_connection is None:
+        return None
+    with _shared_lock:
+        shared_connection.ping(reconnect=True, attempts=3, delay=1)
+    return shared_connection
+
+
+def ensure_tables(conn):
+    global _tables_ready
+    with _tables_lock:
+        if _tables_ready:
+            return
+        cursor = conn.cursor()
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS run_sequence (
+            id VARCHAR(36) PRIMARY KEY,
+            date DATETIME,
+            INDEX ix_run_sequence_date (date)
+        )
+        """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS request (
+            id VARCHAR(36) PRIMARY KEY,
+            date DATETIME,
+            api VARCHAR(256),
+            api_path VARCHAR(512),
+            method VARCHAR(10),
+            variant VARCHAR(128),
+            http_code INT,
+            outcome VARCHAR(10),
+            request JSON,
+            response JSON,
+            violations JSON,
+            latency_ms DOUBLE,
+            ttfb_ms DOUBLE,
+            request_bytes INT,
+            response_bytes INT,
+            retries INT,
+            request_ref CHAR(64),
+            response_ref CHAR(64),
+            replay JSON,
+            run_sequence VARCHAR(36),
+            INDEX ix_request_run_sequence (run_sequence),
+            INDEX ix_request_outcome (outcome),
+            INDEX ix_request_api_method (api, method),
+            INDEX ix_request_run_operation (run_sequence, api, method, variant),
+            INDEX ix_request_request_ref (request_ref),
+            INDEX ix_request_response_ref (response_ref),
+            CONSTRAINT run_sequence_fk FOREIGN KEY (run_sequence) REFERENCES run_sequence(id)
+        )
+        """)
+        _add_missing_columns(cursor, "request", REQUEST_MIGRATIONS)
+        cursor.execute(bodystore.CREATE_TABLE)
+        conn.commit()
+        cursor.close()
+        _tables_ready = True
+
+
+def _add_missing_columns(cursor, table: str, columns: dict):
+    cursor.execute("SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+                   "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", (table,))
+    existing = {name.lower() for (name,) in cursor.fetchall()}
+    for name, ddl in columns.items():
+        if name.lower() not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+
+
+def now():
+    return datetime.datetime.now().replace(microsecond=0)
+
+
+def _json_default(value):
+    """Non-JSON values (bytes, dates, ...) are recorded rather than failing the row."""
+    if isinstance(value, (bytes, bytearray)):
+        return {"base64": base64.b64encode(value).decode("ascii")}
+    return str(value)
+
+
+def _dumps(value):
+    return json.dumps(value, default=_json_default) if value is not None else None
+
+
+class ResultSink:
+    def __init__(self, run_id: str, batch_size: int = SINK_BATCH_SIZE,
+                 flush_interval: float = SINK_FLUSH_INTERVAL, conn=None):
+        self.run_id = run_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.count = 0
+        self.dropped = 0
+        self._owns_conn = conn is None and shared_connection is None
+        self._conn = conn or _shared() or connect()
+        self._buffer: list[dict] = []
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._closed = threading.Event()
+        ensure_tables(self._conn)
+
+        self._timer = None
+        if flush_interval > 0:
+            self._timer = threading.Thread(target=self._flush_periodically,
+                                           name="sink-flush", daemon=True)
+            self._timer.start()
+        _open_sinks.add(self)
+
+    def start_run(self, date=None):
+        """Records the run_sequence row; request rows reference it.
+
+        A run id can be executed more than once (retries of the same job):
+        rows of the previous attempt are replaced by the new one.
+        """
+        with self._flush_lock:
+            cursor = self._conn.cursor()
+            cursor.execute("DELETE FROM request WHERE run_sequence = %s", (self.run_id,))
+            cursor.execute("INSERT INTO run_sequence (id, date) VALUES (%s, %s) "
+                           "ON DUPLICATE KEY UPDATE date = VALUES(date)",
+                           (self.run_id, date or now()))
+            self._conn.commit()
+            cursor.close()
+
+    def add(self, row: dict):
+        """Buffers a request row (keys as in the request table, run_sequence optional)."""
+        with self._buffer_lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.batch_size
+        self._publish(row)
+        if full:
+            self.flush()
+
+    def _publish(self, row: dict):
+        event = {"type": "request", **{c: row.get(c) for c in EVENT_COLUMNS},
+                 "violations": len(row.get("violations") or [])}
+        if os.environ.get(events.RELAY_ENV):
+            # Generated code in a subprocess: the parent relays stdout events.
+            print(events.encode(event), flush=True)
+        else:
+            events.bus.publish(self.run_id, event)
+
+    def flush(self):
+        with self._buffer_lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return
+        bodies, values, dropped = {}, [], set()
+        with self._flush_lock:
+            cursor = self._conn.cursor()
+            try:
+                for row in rows:
+                    try:
+                        values.append(self._values(row, bodies))
+                    except (TypeError, ValueError) as e:
+                        # It would fail every retry: only this row is lost.
+                        dropped.add(id(row))
+                        self.dropped += 1
+                        print(f"ResultSink: request {row.get('id')} not recorded: {e}")
+                if values:
+                    bodystore.store(cursor, bodies.values())
+                    cursor.executemany(
+                        f"INSERT INTO request ({', '.join(REQUEST_COLUMNS)}) "
+                        f"VALUES ({', '.join(['%s'] * len(REQUEST_COLUMNS))})",
+                        values)
+                    self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                # Keep the rows: the next flush (or close) retries them.
+                with self._buffer_lock:
+                    self._buffer[:0] = [row for row in rows if id(row) not in dropped]
+                raise
+            finally:
+                cursor.close()
+            self.count += len(values)
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self._timer is not None:
+            self._timer.join()
+        try:
+            self.flush()
+        finally:
+            _open_sinks.discard(self)
+            if self._owns_conn:
+                self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _values(self, row: dict, bodies: dict) -> tuple:
+        """Column values of a row; large bodies are moved to ``bodies`` by hash."""
+        row = {**row, "run_sequence": row.get("run_sequence") or self.run_id}
+        values = {c: _dumps(row.get(c)) if c in JSON_COLUMNS else row.get(c)
+                  for c in REQUEST_COLUMNS}
+        for column, ref in bodystore.REF_COLUMNS.items():
+            body = bodystore.out_of_line(values[column])
+            if body is not None:
+                bodies[body.hash] = body
+                values[column], values[ref] = None, body.hash
+        return tuple(values[c] for c in REQUEST_COLUMNS)
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"ResultSink flush failed: {e}")
+
+
+@atexit.register
+def _flush_open_sinks():
+    for sink in list(_open_sinks):
+        try:
+            sink.close()
+        except Exception as e:
+            print(f"ResultSink final flush failed: {e}")
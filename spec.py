@@ -0,0 +1,313 @@
+"""OpenAPI 3.x spec model.
+
+Parses a YAML/JSON spec, resolves local ``$ref``s once (memoised per ref, so
+shared and recursive schemas are resolved a single time) and indexes the
+operations by (path, method), operationId and tag.
+
+    spec = load_spec("openapi/example.yaml")
+    op = spec.operation("/pet/{petId}", "GET")
+    op.parameters, op.request_schema, op.responses["200"].schema
+"""
+import json
+from dataclasses import dataclass, field
+from typing import Any
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+HTTP_METHODS = ("get", "put", "post", "delete", "options", "head", "patch", "trace")
+
+
+class SpecError(ValueError):
+    """The document is not a usable OpenAPI 3.x spec."""
+
+
+class SpecDocumentError(SpecError):
+    """The text is not a YAML/JSON document at all."""
+
+
+@dataclass
+class Parameter:
+    name: str
+    location: str
+    required: bool = False
+    schema: dict = field(default_factory=dict)
+    example: Any = None
+
+
+@dataclass
+class ResponseSpec:
+    status: str
+    description: str = ""
+    content: dict = field(default_factory=dict)
+
+    @property
+    def schema(self) -> dict | None:
+        """Schema of the JSON content (or of the first content type)."""
+        media = _preferred_media(self.content)
+        return media.get("schema") if media else None
+
+
+@dataclass
+class Operation:
+    path: str
+    method: str
+    operation_id: str | None = None
+    tags: list = field(default_factory=list)
+    summary: str = ""
+    parameters: list = field(default_factory=list)
+    request_body: dict | None = None
+    responses: dict = field(default_factory=dict)
+    security: list | None = None
+    raw: dict = field(default_factory=dict, repr=False)
+
+    @property
+    def key(self) -> tuple[str, str]:
+        return self.path, self.method
+
+    @property
+    def request_content(self) -> dict:
+        return (self.request_body or {}).get("content") or {}
+
+    @property
+    def request_schema(self) -> dict | None:
+        media = _preferred_media(self.request_content)
+        return media.get("schema") if media else None
+
+    @property
+    def request_examples(self) -> list:
+        """Examples declared on the request body media type or on its schema."""
+        media = _preferred_media(self.request_content)
+        if not media:
+            return []
+        return _examples(media)
+
+    def params(self, location: str) -> list[Parameter]:
+        return [p for p in self.parameters if p.location == location]
+
+
+def _preferred_media(content: dict) -> dict | None:
+    if not content:
+        return None
+    for ctype, media in content.items():
+        if "json" in ctype:
+            return media or {}
+    return next(iter(content.values())) or {}
+
+
+def _examples(node: dict) -> list:
+    if "example" in node:
+        return [node["example"]]
+    if node.get("examples"):
+        return [e.get("value") if isinstance(e, dict) else e
+                for e in node["examples"].values()]
+    schema = node.get("schema") or {}
+    if "example" in schema:
+        return [schema["example"]]
+    return []
+
+
+class Spec:
+    def __init__(self, raw: dict):
+        if not isinstance(raw, dict):
+            raise SpecError("Spec root must be an object")
+        version = str(raw.get("openapi", ""))
+        if not version.startswith("3."):
+            raise SpecError(f"Unsupported OpenAPI version: {version or 'missing'}")
+        self.raw = raw
+        self._refs: dict[str, Any] = {}
+
+        self.operations: list[Operation] = []
+        self.by_key: dict[tuple[str, str], Operation] = {}
+        self.by_id: dict[str, Operation] = {}
+        self.by_tag: dict[str, list[Operation]] = {}
+        self._index()
+
+    @property
+    def info(self) -> dict:
+        return self.raw.get("info") or {}
+
+    @property
+    def title(self) -> str:
+        return self.info.get("title", "")
+
+    @property
+    def servers(self) -> list[str]:
+        return [s.get("url", "") for s in self.raw.get("servers") or []]
+
+    def operation(self, path: str, method: str) -> Operation | None:
+        return self.by_key.get((path, method.upper()))
+
+    def fragment(self, operations: list[Operation]) -> dict:
+        """Standalone spec document with only ``operations`` and the components they reference."""
+        paths = {}
+        for op in operations:
+            item = self._path_item(op.path)
+            entry = paths.setdefault(op.path, {k: v for k, v in item.items()
+                                               if k not in HTTP_METHODS})
+            entry[op.method.lower()] = item[op.method.lower()]
+
+        components = {}
+        pending, seen = _refs_in(paths), set()
+        while pending:
+            ref = pending.pop()
+            if ref in seen or not ref.startswith("#/components/"):
+                continue
+            seen.add(ref)
+            _, _, section, name = ref.split("/", 3)
+            target = self._pointer(ref)
+            components.setdefault(section, {})[name.replace("~1", "/").replace("~0", "~")] = target
+            pending.extend(_refs_in(target))
+        schemes = (self.raw.get("components") or {}).get("securitySchemes")
+        if schemes:
+            components["securitySchemes"] = schemes
+
+        doc = {"openapi": self.raw.get("openapi"),
+               "info": {k: self.info[k] for k in ("title", "version") if k in self.info}}
+        for key in ("servers", "security"):
+            if key in self.raw:
+                doc[key] = self.raw[key]
+        doc["paths"] = paths
+        if components:
+            doc["components"] = components
+        return doc
+
+    def _path_item(self, path: str) -> dict:
+        item = self.raw["paths"][path]
+        if isinstance(item.get("$ref"), str):
+            item = self._pointer(item["$ref"])
+        return item
+
+    def resolve(self, node):
+        """Returns ``node`` with every local $ref replaced by its target."""
+        if isinstance(node, dict):
+            ref = node.get("$ref")
+            if isinstance(ref, str):
+                return self._resolve_ref(ref)
+            return {k: self.resolve(v) for k, v in node.items()}
+        if isinstance(node, list):
+            return [self.resolve(v) for v in node]
+        return node
+
+    def _resolve_ref(self, ref: str):
+        if ref in self._refs:
+            return self._refs[ref]
+        target = self._pointer(ref)
+        if isinstance(target, dict):
+            # Registered before resolving the target, so recursive schemas
+            # end up pointing at the same (shared) dict.
+            resolved = self._refs[ref] = {}
+            resolved.update(self.resolve(target))
+        else:
+            resolved = self._refs[ref] = self.resolve(target)
+        return resolved
+
+    def _pointer(self, ref: str):
+        if not ref.startswith("#/"):
+            raise SpecError(f"Only local $ref are supported: {ref}")
+        node = self.raw
+        for part in ref[2:].split("/"):
+            part = part.replace("~1", "/").replace("~0", "~")
+            if isinstance(node, list):
+                node = node[int(part)]
+            elif isinstance(node, dict) and part in node:
+                node = node[part]
+            else:
+                raise SpecError(f"Unresolvable $ref: {ref}")
+        return node
+
+    def _index(self):
+        for path, item in (self.raw.get("paths") or {}).items():
+            item = self.resolve(item) or {}
+            shared = item.get("parameters") or []
+            for method in HTTP_METHODS:
+                op = item.get(method)
+                if not isinstance(op, dict):
+                    continue
+                operation = self._operation(path, method.upper(), op, shared)
+                self.operations.append(operation)
+                self.by_key[operation.key] = operation
+                if operation.operation_id:
+                    self.by_id[operation.operation_id] = operation
+                for tag in operation.tags or ["default"]:
+                    self.by_tag.setdefault(tag, []).append(operation)
+
+    def _operation(self, path: str, method: str, op: dict, shared: list) -> Operation:
+        # Operation-level parameters override path-level ones with the same name/location.
+        params = {(p.get("name"), p.get("in")): p for p in shared}
+        params.update({(p.get("name"), p.get("in")): p for p in op.get("parameters") or []})
+
+        responses = {
+            str(status): ResponseSpec(status=str(status),
+                                      description=(resp or {}).get("description", ""),
+                                      content=(resp or {}).get("content") or {})
+            for status, resp in (op.get("responses") or {}).items()
+        }
+        return Operation(
+            path=path,
+            method=method,
+            operation_id=op.get("operationId"),
+            tags=list(op.get("tags") or []),
+            summary=op.get("summary", ""),
+            parameters=[_parameter(p) for p in params.values()],
+            request_body=op.get("requestBody"),
+            responses=responses,
+            security=op.get("security", self.raw.get("security")),
+            raw=op,
+        )
+
+
+def _refs_in(node) -> list[str]:
+    refs, stack = [], [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            ref = node.get("$ref")
+            if isinstance(ref, str):
+                refs.append(ref)
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return refs
+
+
+def _parameter(p: dict) -> Parameter:
+    examples = _examples(p)
+    return Parameter(name=p.get("name"),
+                     location=p.get("in"),
+                     required=bool(p.get("required") or p.get("in") == "path"),
+                     schema=p.get("schema") or {},
+                     example=examples[0] if examples else None)
+
+
+def parse_spec(text: str) -> Spec:
+    """Parses a spec from YAML or JSON text."""
+    try:
+        if text.lstrip().startswith("{"):
+            raw = json.loads(text)
+        else:
+            raw = yaml.load(text, Loader=_YamlLoader)
+    except (ValueError, yaml.YAMLError) as e:
+        raise SpecDocumentError(f"Invalid spec document: {e}") from e
+    return Spec(raw)
+
+
+def load_spec(file_path: str) -> Spec:
+    with open(file_path, "r", encoding="utf-8") as f:
+        return parse_spec(f.read())
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    start = time.perf_counter()
+    spec = load_spec(sys.argv[1] if len(sys.argv) > 1 else "openapi/example.yaml")
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{spec.title}: {len(spec.operations)} operations in {elapsed:.1f} ms")
+    for op in spec.operations:
+        print(f"  {op.method:7} {op.path}  ({op.operation_id})")
@@ -0,0 +1,123 @@
+"""Operation-level diff between versions of the same API spec.
+
+Each operation is fingerprinted on its spec fragment (the operation plus
+every component it reaches through ``$ref``), so a change to a shared schema
+marks every operation using it as changed. The last version of each API,
+identified by ``info.title`` and ``servers``, is stored with the generated
+code of its chunks, so a new upload only regenerates what changed.
+"""
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+
+from spec import Spec
+
+SPEC_STORE_DIR = os.environ.get("SPEC_STORE_DIR",
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "specs"))
+
+
+def _hash(doc) -> str:
+    canonical = json.dumps(doc, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def operation_name(op) -> str:
+    return f"{op.method} {op.path}"
+
+
+def api_key(spec: Spec) -> str:
+    """Identity of an API across versions."""
+    return _hash({"title": spec.title, "servers": sorted(spec.servers)})
+
+
+def fingerprints(spec: Spec) -> dict[str, str]:
+    """Hash of every operation, including the schemas it references."""
+    result = {}
+    for op in spec.operations:
+        fragment = spec.fragment([op])
+        result[operation_name(op)] = _hash({"paths": fragment["paths"],
+                                            "components": fragment.get("components")})
+    return result
+
+
+@dataclass
+class SpecDiff:
+    added: list = field(default_factory=list)
+    changed: list = field(default_factory=list)
+    removed: list = field(default_factory=list)
+    unchanged: list = field(default_factory=list)
+
+    @property
+    def dirty(self) -> set[str]:
+        return set(self.added) | set(self.changed)
+
+    def __str__(self):
+        return (f"+{len(self.added)} added, ~{len(self.changed)} changed, "
+                f"-{len(self.removed)} removed, {len(self.unchanged)} unchanged")
+
+
+def diff(old: dict[str, str], new: dict[str, str]) -> SpecDiff:
+    result = SpecDiff()
+    for name, fp in new.items():
+        if name not in old:
+            result.added.append(name)
+        elif old[name] != fp:
+            result.changed.append(name)
+        else:
+            result.unchanged.append(name)
+    result.removed = [name for name in old if name not in new]
+    return result
+
+
+class SpecStore:
+    """Last version of each API: operation fingerprints and chunk code.
+
+    Stored as ``{"fingerprints": {op: fp}, "chunks": {name: {"operations":
+    {op: fp}, "code": str}}}``, one JSON file per API.
+    """
+
+    def __init__(self, directory: str = SPEC_STORE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, key: str) -> dict | None:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def save(self, key: str, version: dict):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(version, f)
+        os.replace(tmp, path)
+
+
+def make_version(fps: dict[str, str], chunks, codes: dict[str, str]) -> dict:
+    """Builds the stored version from chunks (codegen.Chunk) and their code by name."""
+    return {
+        "fingerprints": fps,
+        "chunks": {
+            c.name: {"operations": {operation_name(op): fps[operation_name(op)]
+                                    for op in c.operations},
+                     "code": codes[c.name]}
+            for c in chunks if c.name in codes
+        },
+    }
+
+
+def reusable_code(previous: dict | None, chunk, fps: dict[str, str]) -> str | None:
+    """Stored code of ``chunk`` if none of its operations changed."""
+    if not previous:
+        return None
+    stored = previous.get("chunks", {}).get(chunk.name)
+    if not stored:
+        return None
+    current = {operation_name(op): fps[operation_name(op)] for op in chunk.operations}
+    return stored["code"] if stored["operations"] == current else None
@@ -8,5 +8,20 @@ class AgentState(TypedDict):
     input: str
     agent_outcome: Union[AgentAction, AgentFinish, None]
     intermediate_steps: Annotated[list[tuple[AgentAction, str]], operator.add]
-    number_iterations: int = 0
     file_text: str
+    run_id: str
+    # Path dello spec: il codice generato lo usa per validare le response.
+    spec_path: str | None
+    # True per rigenerare senza usare le risposte LLM in cache.
+    force: bool
+    # Tentativi di generazione/esecuzione completati e budget consumato.
+    iteration: int
+    started_at: float
+    tokens_used: int
+    # Impronta dell'ultimo codice generato e ultimo errore di esecuzione.
+    last_code_hash: str | None
+    last_error: str | None
+    # True se l'ultimo codice è la versione corretta prodotta dal nodo repair.
+    repaired: bool
+    # Valorizzato quando il run deve fermarsi (budget esaurito, retry inutili).
+    stop_reason: str | None
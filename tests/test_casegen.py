@@ -0,0 +1,125 @@
+"""Cases generated from the schemas, without the LLM."""
+import http.server
+import json
+import re
+import threading
+
+import pytest
+
+import casegen
+from codegen import chunk_operations
+from runner import Runner
+from spec import load_spec, parse_spec
+
+ITEMS_SPEC = """
+openapi: 3.0.0
+info: {title: Items, version: "1"}
+paths:
+  /item/{itemId}:
+    delete:
+      parameters:
+        - {name: itemId, in: path, required: true, schema: {type: integer}}
+      responses: {"200": {description: ok}}
+  /item/findByTags:
+    get:
+      parameters:
+        - {name: tags, in: query, schema: {type: array, items: {type: string}}}
+      responses: {"200": {description: ok}}
+  /event:
+    post:
+      requestBody:
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                day: {type: string, format: date}
+            example: {day: 2024-05-01}
+      responses: {"200": {description: ok}}
+"""
+
+
+def _calls(spec) -> list[str]:
+    return [line for chunk in chunk_operations(spec, "tag")
+            for line in casegen.chunk_code(chunk).splitlines() if line.startswith("runner.add(")]
+
+
+def _operation(spec, method, path):
+    return next(op for op in spec.operations if op.method == method and op.path == path)
+
+
+@pytest.fixture(scope="module")
+def petstore():
+    return load_spec("openapi/example.yaml")
+
+
+def test_only_create_read_delete_chains_are_grouped(petstore):
+    calls = _calls(petstore)
+    grouped = [c for c in calls if "group=" in c]
+    assert grouped and len(grouped) < len(calls)
+    assert not any("findByStatus" in c and "group=" in c for c in calls)
+    assert not any("variant='invalid'" in c and "group=" in c for c in calls)
+    assert {re.search(r"group='([^']+)'", c).group(1) for c in grouped} >= {"pet-example", "pet-valid"}
+
+
+def test_each_chain_deletes_its_own_resource(petstore):
+    deletes = [c for c in _calls(petstore) if c.startswith("runner.add('/pet/{petId}', 'DELETE'")]
+    paths = [re.search(r"path='([^']+)'", c).group(1) for c in deletes if "invalid" not in c]
+    assert len(paths) == 2 and len(set(paths)) == 2
+
+
+def test_deletes_without_a_create_get_distinct_ids():
+    op = _operation(parse_spec(ITEMS_SPEC), "DELETE", "/item/{itemId}")
+    example, valid = casegen.build_cases(op)[:2]
+    assert example.path != valid.path
+
+
+def test_unconstrained_array_query_has_no_invalid_case():
+    op = _operation(parse_spec(ITEMS_SPEC), "GET", "/item/findByTags")
+    assert [c.name for c in casegen.build_cases(op)] == ["example", "valid"]
+
+
+def test_yaml_dates_are_rendered_as_strings():
+    op = _operation(parse_spec(ITEMS_SPEC), "POST", "/event")
+    example = casegen.build_cases(op)[0]
+    code = casegen.render_call(op, example)
+    assert "datetime" not in code and "'2024-05-01'" in code
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def _reply(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+def test_recorded_rows_are_json(petstore, server, monkeypatch):
+    monkeypatch.setattr("runner.get_oauth2_bearer_token", lambda: "token")
+    rows = []
+    runner = Runner(server, on_result=rows.append)
+    for chunk in chunk_operations(petstore, "tag"):
+        if all(casegen.supported(op) for op in chunk.operations):
+            exec(casegen.chunk_code(chunk), {"runner": runner})
+    runner.run()
+
+    assert len(rows) == len(runner.calls) > 0
+    for row in rows:
+        json.dumps(row["request"])
+        json.dumps(row["replay"])
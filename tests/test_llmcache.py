@@ -0,0 +1,59 @@
+"""Offline tests of the LLM response cache, with a fake chat model."""
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+import llmcache
+from llmcache import LLMResponseCache, SQLiteStore, refreshing
+
+
+@pytest.fixture
+def cache():
+    return LLMResponseCache(SQLiteStore(":memory:"), ttl=60, max_entries=2, evict_every=1)
+
+
+@pytest.fixture
+def chain(cache):
+    llm = FakeListChatModel(responses=["print(1)", "print(2)", "print(3)", "print(4)"], cache=cache)
+    return ChatPromptTemplate.from_template("Genera codice per {file_text}") | llm | StrOutputParser()
+
+
+def test_miss_then_hit(cache, chain):
+    assert chain.invoke({"file_text": "spec A"}) == "print(1)"
+    assert chain.invoke({"file_text": "spec A"}) == "print(1)"
+    assert chain.invoke({"file_text": "spec B"}) == "print(2)"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["writes"]) == (1, 2, 2)
+
+
+def test_expired_entry_is_regenerated(cache, chain, monkeypatch):
+    assert chain.invoke({"file_text": "spec A"}) == "print(1)"
+    now = llmcache.time.time()
+    monkeypatch.setattr(llmcache.time, "time", lambda: now + 61)
+    assert chain.invoke({"file_text": "spec A"}) == "print(2)"
+    assert cache.stats()["expired"] == 1
+
+
+def test_least_recently_used_entry_is_evicted(cache, chain):
+    lookups = []
+    lookup = cache.lookup
+    cache.lookup = lambda prompt, llm_string: lookups.append((prompt, llm_string)) or lookup(prompt, llm_string)
+
+    chain.invoke({"file_text": "spec A"})
+    chain.invoke({"file_text": "spec B"})
+    chain.invoke({"file_text": "spec B"})  # spec B is now the most recently used
+    chain.invoke({"file_text": "spec C"})
+
+    assert cache.stats()["evicted"] == 1
+    spec_a, spec_b = lookups[0], lookups[1]
+    assert lookup(*spec_a) is None
+    assert lookup(*spec_b) is not None
+
+
+def test_refreshing_skips_lookup_and_overwrites(cache, chain):
+    assert chain.invoke({"file_text": "spec A"}) == "print(1)"
+    with refreshing():
+        assert chain.batch([{"file_text": "spec A"}]) == ["print(2)"]
+    assert chain.invoke({"file_text": "spec A"}) == "print(2)"
+    assert cache.stats()["refreshed"] == 1
@@ -0,0 +1,63 @@
+"""Rows recorded by the Runner when something other than the HTTP call fails."""
+import http.server
+import threading
+
+import pytest
+
+import runner
+from runner import Runner
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = b'{"id": 1}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+class _BrokenValidator:
+    def validate(self, *args):
+        raise KeyError("schema")
+
+
+def test_validator_error_keeps_the_response(server):
+    r = Runner(server)
+    r.validator = _BrokenValidator()
+    r.add("/pet/1", "GET", auth=False)
+    [row] = r.run()
+    assert (row["http_code"], row["outcome"], row["response"]) == (200, "OK", {"id": 1})
+    assert row["violations"][0]["kind"] == "validator"
+
+
+def test_token_error_fails_only_its_call(server, monkeypatch):
+    def no_token():
+        raise ValueError("Env variables missing: IDM_URL")
+    monkeypatch.setattr(runner, "get_oauth2_bearer_token", no_token)
+    r = Runner(server)
+    r.add("/pet/1", "GET")
+    r.add("/pet/2", "GET", auth=False)
+    with_auth, without_auth = r.run()
+    assert with_auth["outcome"] == "FAILED" and "IDM_URL" in with_auth["response"]["error"]
+    assert without_auth["outcome"] == "OK"
+
+
+def test_credentials_are_not_recorded(server):
+    r = Runner(server)
+    r.add("/pet/1", "GET", auth=False, headers={"Authorization": "Bearer secret", "X-Trace": "1"})
+    [row] = r.run()
+    assert row["replay"]["headers"] == {"X-Trace": "1"}
+    assert row["replay"]["auth"] is True
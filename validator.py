@@ -0,0 +1,385 @@
+"""Validation of recorded responses against the spec.
+
+Each operation's response schemas are compiled once into plain Python
+closures (type, enum, required, properties, items, lengths, ranges,
+patterns, formats, allOf/oneOf/anyOf), so validating a response is a walk
+over the body with no schema interpretation left. Compiled validators are
+cached per spec content hash and shared by every Runner of the process.
+
+A response yields a list of violations, each a dict:
+
+    {"kind": "status" | "content_type" | "body", "path": "$.tags[0].name", "message": "..."}
+
+    python validator.py openapi/example.yaml   # throughput benchmark
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+from codecache import spec_hash
+from spec import Operation, Spec, parse_spec
+
+VALIDATOR_CACHE_SIZE = int(os.environ.get("VALIDATOR_CACHE_SIZE", "8"))
+# Violations recorded per response: enough to diagnose, bounded in size.
+MAX_VIOLATIONS = int(os.environ.get("VALIDATOR_MAX_VIOLATIONS", "20"))
+
+Check = Callable[[object, str, list], None]
+
+_TYPES = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+_FORMATS = {
+    "date-time": re.compile(r"^\d{4}-\d{2}-\d{2}[Tt ]\d{2}:\d{2}:\d{2}(\.\d+)?([Zz]|[+-]\d{2}:?\d{2})?$"),
+    "date": re.compile(r"^\d{4}-\d{2}-\d{2}$"),
+    "email": re.compile(r"^[^@\s]+@[^@\s]+$"),
+    "uuid": re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$"),
+}
+
+
+def _violation(path: str, message: str) -> dict:
+    return {"kind": "body", "path": path, "message": message}
+
+
+def compile_schema(schema: dict, _memo: dict | None = None) -> Check:
+    """Compiles ``schema`` into ``check(value, path, violations)``.
+
+    Shared and recursive schemas (resolved $refs are the same dict) are
+    compiled once.
+    """
+    memo = {} if _memo is None else _memo
+    key = id(schema)
+    if key in memo:
+        cell = memo[key]
+        return cell[0] or (lambda value, path, out: cell[0](value, path, out))
+    cell = memo[key] = [None]
+    if not isinstance(schema, dict) or not schema:
+        cell[0] = lambda value, path, out: None
+        return cell[0]
+
+    checks: list[Check] = []
+
+    types = schema.get("type")
+    types = [types] if isinstance(types, str) else list(types or [])
+    nullable = schema.get("nullable") or "null" in types
+    type_tests = [_TYPES[t] for t in types if t in _TYPES and t != "null"]
+    type_name = "/".join(t for t in types if t != "null")
+
+    if "enum" in schema:
+        allowed = schema["enum"]
+        try:
+            allowed_set = frozenset(allowed)
+        except TypeError:
+            allowed_set = None
+
+        def check_enum(value, path, out):
+            try:
+                ok = value in allowed_set if allowed_set is not None else value in allowed
+            except TypeError:
+                ok = value in allowed
+            if not ok:
+                out.append(_violation(path, f"{value!r} is not one of {allowed!r}"))
+        checks.append(check_enum)
+
+    checks.extend(_string_checks(schema))
+    checks.extend(_number_checks(schema))
+    checks.extend(_array_checks(schema, memo))
+    checks.extend(_object_checks(schema, memo))
+    checks.extend(_composition_checks(schema, memo))
+
+    def validate(value, path, out):
+        if value is None and nullable:
+            return
+        if type_tests and not any(test(value) for test in type_tests):
+            out.append(_violation(path, f"expected {type_name}, got {type(value).__name__}"))
+            return
+        for check in checks:
+            check(value, path, out)
+
+    cell[0] = validate
+    return validate
+
+
+def _string_checks(schema: dict) -> list[Check]:
+    checks = []
+    min_length, max_length = schema.get("minLength"), schema.get("maxLength")
+    if min_length is not None or max_length is not None:
+        def check_length(value, path, out):
+            if isinstance(value, str):
+                if min_length is not None and len(value) < min_length:
+                    out.append(_violation(path, f"shorter than {min_length} characters"))
+                if max_length is not None and len(value) > max_length:
+                    out.append(_violation(path, f"longer than {max_length} characters"))
+        checks.append(check_length)
+    if schema.get("pattern"):
+        try:
+            pattern = re.compile(schema["pattern"])
+        except re.error:
+            pattern = None
+        if pattern is not None:
+            def check_pattern(value, path, out):
+                if isinstance(value, str) and not pattern.search(value):
+                    out.append(_violation(path, f"does not match {pattern.pattern!r}"))
+            checks.append(check_pattern)
+    fmt = _FORMATS.get(schema.get("format"))
+    if fmt is not None:
+        name = schema["format"]
+
+        def check_format(value, path, out):
+            if isinstance(value, str) and not fmt.match(value):
+                out.append(_violation(path, f"not a valid {name}"))
+        checks.append(check_format)
+    return checks
+
+
+def _number_checks(schema: dict) -> list[Check]:
+    low, high = schema.get("minimum"), schema.get("maximum")
+    ex_low, ex_high = schema.get("exclusiveMinimum"), schema.get("exclusiveMaximum")
+    # OpenAPI 3.0: boolean flags on minimum/maximum; 3.1: numeric bounds.
+    if isinstance(ex_low, bool):
+        ex_low = low if ex_low else None
+        low = None if ex_low is not None else low
+    if isinstance(ex_high, bool):
+        ex_high = high if ex_high else None
+        high = None if ex_high is not None else high
+    multiple = schema.get("multipleOf")
+    if low is None and high is None and ex_low is None and ex_high is None and not multiple:
+        return []
+
+    def check_range(value, path, out):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return
+        if low is not None and value < low:
+            out.append(_violation(path, f"{value} < minimum {low}"))
+        if high is not None and value > high:
+            out.append(_violation(path, f"{value} > maximum {high}"))
+        if ex_low is not None and value <= ex_low:
+            out.append(_violation(path, f"{value} <= exclusive minimum {ex_low}"))
+        if ex_high is not None and value >= ex_high:
+            out.append(_violation(path, f"{value} >= exclusive maximum {ex_high}"))
+        if multiple and (value / multiple) % 1:
+            out.append(_violation(path, f"{value} is not a multiple of {multiple}"))
+    return [check_range]
+
+
+def _array_checks(schema: dict, memo: dict) -> list[Check]:
+    checks = []
+    min_items, max_items = schema.get("minItems"), schema.get("maxItems")
+    if min_items is not None or max_items is not None:
+        def check_size(value, path, out):
+            if isinstance(value, list):
+                if min_items is not None and len(value) < min_items:
+                    out.append(_violation(path, f"fewer than {min_items} items"))
+                if max_items is not None and len(value) > max_items:
+                    out.append(_violation(path, f"more than {max_items} items"))
+        checks.append(check_size)
+    if isinstance(schema.get("items"), dict) and schema["items"]:
+        item_check = compile_schema(schema["items"], memo)
+
+        def check_items(value, path, out):
+            if isinstance(value, list):
+                for i, item in enumerate(value):
+                    if len(out) >= MAX_VIOLATIONS:
+                        return
+                    item_check(item, f"{path}[{i}]", out)
+        checks.append(check_items)
+    return checks
+
+
+def _object_checks(schema: dict, memo: dict) -> list[Check]:
+    checks = []
+    required = tuple(schema.get("required") or ())
+    if required:
+        def check_required(value, path, out):
+            if isinstance(value, dict):
+                for name in required:
+                    if name not in value:
+                        out.append(_violation(f"{path}.{name}", "required property missing"))
+        checks.append(check_required)
+
+    properties = {name: compile_schema(sub, memo)
+                  for name, sub in (schema.get("properties") or {}).items()
+                  if isinstance(sub, dict) and not sub.get("writeOnly")}
+    additional = schema.get("additionalProperties", True)
+    extra_check = compile_schema(additional, memo) if isinstance(additional, dict) and additional else None
+    if properties or additional is False or extra_check:
+        def check_properties(value, path, out):
+            if not isinstance(value, dict):
+                return
+            for name, item in value.items():
+                if len(out) >= MAX_VIOLATIONS:
+                    return
+                check = properties.get(name)
+                if check is not None:
+                    check(item, f"{path}.{name}", out)
+                elif additional is False:
+                    out.append(_violation(f"{path}.{name}", "additional property not allowed"))
+                elif extra_check is not None:
+                    extra_check(item, f"{path}.{name}", out)
+        checks.append(check_properties)
+    return checks
+
+
+def _composition_checks(schema: dict, memo: dict) -> list[Check]:
+    checks = []
+    for part in schema.get("allOf") or []:
+        checks.append(compile_schema(part, memo))
+    for key in ("oneOf", "anyOf"):
+        alternatives = [compile_schema(s, memo) for s in schema.get(key) or []]
+        if not alternatives:
+            continue
+        exactly_one = key == "oneOf"
+
+        def check_alternatives(value, path, out, alternatives=alternatives,
+                               exactly_one=exactly_one, key=key):
+            matches = 0
+            for alternative in alternatives:
+                errors = []
+                alternative(value, path, errors)
+                matches += not errors
+            if matches == 0 or (exactly_one and matches > 1):
+                out.append(_violation(path, f"matches {matches} of the {key} schemas"))
+        checks.append(check_alternatives)
+    return checks
+
+
+class OperationValidator:
+    """Compiled checks for the responses of one operation."""
+
+    def __init__(self, op: Operation, memo: dict):
+        # status -> {media type -> body check or None}
+        self.responses: dict[str, dict[str, Check | None]] = {}
+        for status, response in op.responses.items():
+            self.responses[status.upper()] = {
+                ctype.split(";")[0].strip().lower():
+                    compile_schema(media["schema"], memo) if (media or {}).get("schema") else None
+                for ctype, media in response.content.items()
+            }
+
+    def _declared(self, status: int) -> dict | None:
+        code = str(status)
+        for key in (code, f"{code[0]}XX", "DEFAULT"):
+            if key in self.responses:
+                return self.responses[key]
+        return None
+
+    def validate(self, status: int, content_type: str | None, body) -> list[dict]:
+        content = self._declared(status)
+        if content is None:
+            return [{"kind": "status", "path": "", "message": f"status {status} not documented"}]
+        if not content or body is None:
+            return []
+
+        ctype = (content_type or "").split(";")[0].strip().lower()
+        media = _match_media(content, ctype)
+        if media is None:
+            return [{"kind": "content_type", "path": "",
+                     "message": f"{ctype or 'no content type'} not in {sorted(content)}"}]
+        check = content[media]
+        if check is None:
+            return []
+        if "json" in media and isinstance(body, str):
+            return [_violation("$", "body is not valid JSON")]
+        violations = []
+        check(body, "$", violations)
+        return violations[:MAX_VIOLATIONS]
+
+
+def _match_media(content: dict, ctype: str) -> str | None:
+    if ctype in content:
+        return ctype
+    for media in content:
+        if media == "*/*" or (media.endswith("/*") and ctype.startswith(media[:-1])):
+            return media
+    return None
+
+
+class SpecValidator:
+    """Response validators of every operation of a spec, compiled on first use."""
+
+    def __init__(self, spec: Spec):
+        self.spec = spec
+        self._memo: dict = {}
+        self._operations: dict[tuple[str, str], OperationValidator | None] = {}
+        self._lock = threading.Lock()
+        # Path templates as regexes, for recorded paths that are concrete or prefixed.
+        self._templates = [
+            (re.compile("(?:^|/)" + re.sub(r"\\\{[^/]+?\\\}", "[^/]+", re.escape(op.path.strip("/")))
+                        + "/?$"), op)
+            for op in sorted(spec.operations, key=lambda op: -len(op.path))
+        ]
+
+    def _operation(self, api: str, method: str) -> Operation | None:
+        op = self.spec.operation(api, method)
+        if op is not None:
+            return op
+        path = api.split("?")[0].rstrip("/")
+        for pattern, candidate in self._templates:
+            if candidate.method == method and pattern.search(path):
+                return candidate
+        return None
+
+    def validator(self, api: str, method: str) -> OperationValidator | None:
+        key = (api, method.upper())
+        if key not in self._operations:
+            with self._lock:
+                if key not in self._operations:
+                    op = self._operation(api, key[1])
+                    self._operations[key] = OperationValidator(op, self._memo) if op else None
+        return self._operations[key]
+
+    def validate(self, api: str, method: str, status: int,
+                 content_type: str | None, body) -> list[dict] | None:
+        """Violations of a response; None when the operation is not in the spec."""
+        validator = self.validator(api, method)
+        if validator is None:
+            return None
+        return validator.validate(status, content_type, body)
+
+
+_validators: OrderedDict[str, SpecValidator] = OrderedDict()
+_validators_lock = threading.Lock()
+
+
+def get_validator(spec_path: str) -> SpecValidator:
+    """Validator of the spec at ``spec_path``, shared per spec content hash."""
+    with open(spec_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    key = spec_hash(text)
+    with _validators_lock:
+        validator = _validators.get(key)
+        if validator is not None:
+            _validators.move_to_end(key)
+            return validator
+    validator = SpecValidator(parse_spec(text))
+    with _validators_lock:
+        validator = _validators.setdefault(key, validator)
+        while len(_validators) > VALIDATOR_CACHE_SIZE:
+            _validators.popitem(last=False)
+    return validator
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    validator = get_validator(sys.argv[1] if len(sys.argv) > 1 else "openapi/example.yaml")
+    pet = {"id": 10, "name": "doggie", "category": {"id": 1, "name": "Dogs"},
+           "photoUrls": ["url"], "tags": [{"id": 1, "name": "tag"}], "status": "available"}
+    bad = {"id": "10", "category": {"id": 1}, "photoUrls": "url", "status": "lost"}
+    print(validator.validate("/pet/{petId}", "GET", 200, "application/json", bad))
+
+    n = 100_000
+    start = time.perf_counter()
+    for _ in range(n):
+        validator.validate("/pet/{petId}", "GET", 200, "application/json", pet)
+    elapsed = time.perf_counter() - start
+    print(f"{n / elapsed:,.0f} responses/s")